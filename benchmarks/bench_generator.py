@@ -0,0 +1,269 @@
+"""
+Offline benchmarks for the non-LLM parts of llm-data-generator.py.
+
+A deterministic fake LanguageModel answers every prompt with synthetic JSON of the requested size after a
+configurable latency, so prompt building, response parsing, validation and the create_* pipelines can be
+measured without a provider. Each scenario reports throughput, latency and peak traced memory; throughput
+is records per second except for prompt_building, which reports prompts built per second.
+
+    python benchmarks/bench_generator.py --sizes 1000 10000 100000
+    python benchmarks/bench_generator.py --save-baseline benchmarks/baseline.json
+    python benchmarks/bench_generator.py --baseline benchmarks/baseline.json --max-regression 0.2
+
+With --baseline the run exits with status 1 when any scenario's throughput falls more than --max-regression
+below the baseline. Requires the same environment as the component (langflow, langchain).
+"""
+import argparse
+import importlib.util
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List
+
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+REQUESTED_COUNT = re.compile(r"Generate a list of '?(\d+)'?")
+UNITS = {"prompt_building": "prompts"}
+GENERATOR_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "llm-data-generator.py")
+
+
+def load_generator_module() -> Any:
+    spec = importlib.util.spec_from_file_location("llm_data_generator", GENERATOR_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class FakeLanguageModel:
+    """
+    Chat model stand-in that returns synthetic JSON arrays for category, product and user prompts.
+    Ids referenced by products and users are taken from the component's current dataset so every record
+    validates; reject_rate makes that fraction of records reference an unknown category or product.
+    """
+    def __init__(self, latency: float = 0.0, seed: int = 0, reject_rate: float = 0.0, chunk_size: int = 64):
+        self.component: Any = None
+        self.latency = latency
+        self.reject_rate = reject_rate
+        self.chunk_size = chunk_size
+        self.rng = random.Random(seed)
+        self.calls = 0
+        self.model_name = "fake-benchmark-model"
+    @staticmethod
+    def requested_count(prompt: str) -> int:
+        match = REQUESTED_COUNT.search(prompt)
+        return int(match.group(1)) if match else 1
+    def categories(self, count: int) -> List[Dict]:
+        records = []
+        for index in range(count):
+            category_id = str(uuid.UUID(int=self.rng.getrandbits(128)))
+            records.append({
+                "id": category_id,
+                "name": f"Category {index}",
+                "description": "Synthetic benchmark category",
+                "subcategories": [
+                    {"id": str(uuid.UUID(int=self.rng.getrandbits(128))), "name": f"Subcategory {index}.{sub}", "description": "Synthetic subcategory", "parent_id": category_id}
+                    for sub in range(3)
+                ],
+            })
+        return records
+    def products(self, count: int) -> List[Dict]:
+        subcategories = [c.data for c in self.component.all_categories if "parent_id" in c.data]
+        records = []
+        for _ in range(count):
+            sub = self.rng.choice(subcategories)
+            records.append({
+                "id": str(uuid.UUID(int=self.rng.getrandbits(128))),
+                "name": f"Product {self.rng.randrange(10**6)}",
+                "description": "Synthetic benchmark product with a medium length description for realistic payload sizes",
+                "category_id": sub["parent_id"] if self.rng.random() >= self.reject_rate else "unknown-category",
+                "subcategory_id": sub["id"],
+                "price": round(self.rng.uniform(5, 500), 2),
+                "specifications": {"weight": "1.2 lbs", "dimensions": "10 x 4 x 2 in", "color": "Black", "material": "Aluminum", "warranty": "1 year"},
+                "inventory": {"stock_count": self.rng.randrange(500), "sku": f"SKU-{self.rng.randrange(10**6):06d}", "warehouse_location": "Reno, NV"},
+                "ratings": {"average_score": round(self.rng.uniform(1, 5), 1), "review_count": self.rng.randrange(5000)},
+                "shipping_info": {"free_shipping": self.rng.random() < 0.5, "shipping_weight": "1.5 lbs", "handling_time": "1-2 business days"},
+            })
+        return records
+    def users(self, count: int) -> List[Dict]:
+        product_ids = [p.data["id"] for p in self.component.all_products]
+        category_ids = [c.data["id"] for c in self.component.all_categories]
+        records = []
+        for _ in range(count):
+            user_id = str(uuid.UUID(int=self.rng.getrandbits(128)))
+            records.append({
+                "id": user_id,
+                "name": "Benchmark User",
+                "email": f"{user_id[:12]}@example.com",
+                "join_date": "2023-03-14",
+                "purchase_history": [
+                    {"product_id": self.rng.choice(product_ids) if self.rng.random() >= self.reject_rate else "unknown-product", "purchase_date": "2024-02-01"}
+                    for _ in range(self.rng.randint(3, 5))
+                ],
+                "favorite_categories": [{"category_id": category_id, "name": "Category"} for category_id in self.rng.sample(category_ids, min(2, len(category_ids)))],
+                "account_status": "active",
+                "last_login": "2024-06-01",
+            })
+        return records
+    def respond(self, prompt: str) -> str:
+        self.calls += 1
+        count = self.requested_count(prompt)
+        if "top-level categories" in prompt:
+            records = self.categories(count)
+        elif "user profiles" in prompt:
+            records = self.users(count)
+        else:
+            records = self.products(count)
+        if self.latency:
+            time.sleep(self.latency)
+        return json.dumps(records)
+    def invoke(self, messages: List[Any]) -> AIMessage:
+        return AIMessage(content=self.respond(messages[-1].content))
+    async def ainvoke(self, messages: List[Any]) -> AIMessage:
+        return self.invoke(messages)
+    def stream(self, messages: List[Any]) -> Iterator[AIMessageChunk]:
+        content = self.respond(messages[-1].content)
+        for start in range(0, len(content), self.chunk_size):
+            yield AIMessageChunk(content=content[start:start + self.chunk_size])
+    async def astream(self, messages: List[Any]) -> AsyncIterator[AIMessageChunk]:
+        for chunk in self.stream(messages):
+            yield chunk
+
+
+def make_component(module: Any, llm: FakeLanguageModel, spill_dir: str, **params: Any) -> Any:
+    settings = {
+        "store_theme": "Benchmark Store",
+        "cache_llm_responses": False,
+        "keep_runs": 1,
+        "spill_dir": spill_dir,
+        "sharded_products": True,
+        "shard_strategy": "fixed",
+        "products_per_shard": 100,
+        "max_concurrency": 4,
+        **params,
+    }
+    component = module.CustomComponent(llm=llm, **settings)
+    llm.component = component
+    return component
+
+
+def measure(run: Callable[[], int], trace_memory: bool) -> Dict[str, float]:
+    """
+    Times one run, then repeats it under tracemalloc for the peak allocation so tracing does not skew timings
+    """
+    started = time.perf_counter()
+    units = run()
+    elapsed = time.perf_counter() - started
+    result = {"units": units, "seconds": round(elapsed, 4), "throughput": round(units / elapsed, 1) if elapsed else 0.0}
+    if trace_memory:
+        tracemalloc.start()
+        run()
+        result["peak_mb"] = round(tracemalloc.get_traced_memory()[1] / 1e6, 2)
+        tracemalloc.stop()
+    return result
+
+
+def scenarios(module: Any, size: int, args: argparse.Namespace, spill_dir: str) -> Dict[str, Callable[[], int]]:
+    """
+    Returns: {name: run} where each run prepares fresh state and returns the number of units processed,
+    records for every scenario except prompt_building, which counts prompts (see UNITS)
+    """
+    def seeded_component(**params: Any) -> Any:
+        llm = FakeLanguageModel(latency=args.latency, seed=args.seed, reject_rate=args.reject_rate)
+        component = make_component(module, llm, spill_dir, num_categories=args.categories, num_products=size, num_users=size, **params)
+        component.create_categories()
+        return component
+    base = seeded_component()
+    products_json = json.dumps(base.llm.products(size))
+    def prompt_building() -> int:
+        shards = base.plan_product_shards()
+        for shard in shards:
+            base.generate_products_prompt(base.build_product_category_info(shard["categories"]), shard["count"], shard["start"])
+        return len(shards)
+    def response_parsing() -> int:
+        valid, _, records = base.parse_llm_response(products_json, "product generation")
+        return len(records) if valid else 0
+    def product_validation() -> int:
+        base.validate_products(json.loads(products_json))
+        return size
+    def create_products() -> int:
+        component = seeded_component()
+        return len(component.create_products())
+    def create_products_streamed() -> int:
+        component = seeded_component(stream_output=True)
+        return len(component.create_products())
+    def create_users() -> int:
+        component = seeded_component(batched_users=True, users_per_batch=100)
+        component.create_products()
+        component.all_users = []
+        return len(component.create_users())
+    return {
+        "prompt_building": prompt_building,
+        "response_parsing": response_parsing,
+        "product_validation": product_validation,
+        "create_products": create_products,
+        "create_products_streamed": create_products_streamed,
+        "create_users": create_users,
+    }
+
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], max_regression: float) -> List[str]:
+    failures = []
+    for key, result in results.items():
+        expected = baseline.get(key, {}).get("throughput")
+        if expected and result["throughput"] < expected * (1 - max_regression):
+            unit = UNITS.get(key.split("@")[0], "records")
+            failures.append(f"{key}: {result['throughput']:.1f} {unit}/s is more than {max_regression:.0%} below baseline {expected:.1f}")
+    return failures
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000], help="record counts to benchmark")
+    parser.add_argument("--scenarios", nargs="+", help="only run these scenarios")
+    parser.add_argument("--categories", type=int, default=10, help="top-level categories in the synthetic catalog")
+    parser.add_argument("--latency", type=float, default=0.0, help="fake LLM latency per call in seconds")
+    parser.add_argument("--reject-rate", type=float, default=0.02, help="fraction of synthetic records with bad references")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc pass")
+    parser.add_argument("--baseline", help="JSON results to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="allowed throughput drop relative to the baseline")
+    parser.add_argument("--save-baseline", help="write these results as a new baseline")
+    parser.add_argument("--output", default="bench_output.txt", help="text report path, empty to only print")
+    args = parser.parse_args()
+    module = load_generator_module()
+    results: Dict[str, Dict] = {}
+    lines = [f"{'scenario':<28}{'size':>8}{'seconds':>10}{'throughput':>14}{'unit':>10}{'peak MB':>10}"]
+    with tempfile.TemporaryDirectory() as spill_dir:
+        for size in args.sizes:
+            for name, run in scenarios(module, size, args, spill_dir).items():
+                if args.scenarios and name not in args.scenarios:
+                    continue
+                result = measure(run, not args.no_memory)
+                results[f"{name}@{size}"] = result
+                unit = UNITS.get(name, "records") + "/s"
+                line = f"{name:<28}{size:>8}{result['seconds']:>10.3f}{result['throughput']:>14.1f}{unit:>10}{result.get('peak_mb', float('nan')):>10.2f}"
+                lines.append(line)
+                print(line, flush=True)
+    failures: List[str] = []
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            failures = compare(results, json.load(f), args.max_regression)
+        lines.extend(failures or [f"No regressions beyond {args.max_regression:.0%} against {args.baseline}"])
+        print("\n".join(lines[-max(1, len(failures)):]))
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,156 @@
+"""
+Offline check of the generator's retry and rate limiting behaviour against injected 429 errors.
+
+An error-injecting fake LanguageModel rejects chosen calls with a rate limit error carrying a retry-after
+header, while the component generates sharded products through the shared rate limiter. The run checks that
+
+- every shard still succeeds and each injected error was retried exactly once,
+- no call starts while the limiter is paused for a retry-after period,
+- retry delays stay within the jittered exponential backoff bounds and never undercut a retry-after hint,
+- concurrency never exceeds max_concurrency, the AIMD window halves on throttling and grows back afterwards.
+
+    python benchmarks/check_rate_limiter.py
+    python benchmarks/check_rate_limiter.py --fail-calls 3 4 5 6 --retry-after 0.5
+
+Exits with status 1 when a check fails. Requires the same environment as the component (langflow, langchain).
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+
+from langchain_core.messages import AIMessage
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from bench_generator import FakeLanguageModel, load_generator_module, make_component  # noqa: E402
+
+
+class RateLimitError(Exception):
+    """
+    Provider style 429 error with the retry-after hint in the headers of its HTTP response
+    """
+    status_code = 429
+    def __init__(self, retry_after: float):
+        super().__init__("Rate limit exceeded")
+        self.response = type("Response", (), {"headers": {"retry-after": str(retry_after)}})()
+
+
+class ErrorInjectingLanguageModel(FakeLanguageModel):
+    """
+    FakeLanguageModel whose ainvoke sleeps asynchronously and fails the product calls listed in fail_calls
+    (0-based, in start order) with a RateLimitError. Records the start and end of every call, whether it
+    failed, the concurrency and the limiter window at its start.
+    """
+    def __init__(self, fail_calls: List[int], retry_after: float, **params: Any):
+        super().__init__(**params)
+        self.fail_calls = set(fail_calls)
+        self.retry_after = retry_after
+        self.product_calls = 0
+        self.active = 0
+        self.peak = 0
+        self.limiter: Any = None
+        self.log: List[Dict[str, Any]] = []
+    async def ainvoke(self, messages: List[Any]) -> AIMessage:
+        prompt = messages[-1].content
+        entry = {"start": time.monotonic(), "window": self.limiter.window if self.limiter else None, "failed": False}
+        self.log.append(entry)
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await asyncio.sleep(self.latency)
+            if "top-level categories" not in prompt:
+                call = self.product_calls
+                self.product_calls += 1
+                if call in self.fail_calls:
+                    entry["failed"] = True
+                    raise RateLimitError(self.retry_after)
+            return AIMessage(content=self.respond(prompt))
+        finally:
+            entry["end"] = time.monotonic()
+            self.active -= 1
+
+
+def check_backoff(component: Any, retry_after: float) -> List[str]:
+    """
+    Samples retry_delay for every attempt and checks it against the backoff bounds and the retry-after hint
+    """
+    failures = []
+    base, cap = component.retry_base_delay, component.retry_max_delay
+    for attempt in range(component.max_retries):
+        bound = min(cap, base * 2 ** attempt)
+        delays = [component.retry_delay(TimeoutError("timed out"), attempt) for _ in range(200)]
+        if any(delay is None or not 0 <= delay <= bound for delay in delays):
+            failures.append(f"backoff: attempt {attempt} delay outside [0, {bound:.3f}]s")
+        hinted = [component.retry_delay(RateLimitError(retry_after), attempt) for _ in range(200)]
+        if any(delay is None or delay < retry_after for delay in hinted):
+            failures.append(f"backoff: attempt {attempt} delay shorter than the {retry_after}s retry-after hint")
+    if component.retry_delay(TimeoutError("timed out"), component.max_retries) is not None:
+        failures.append("backoff: retried beyond max_retries")
+    if component.retry_delay(ValueError("bad request"), 0) is not None:
+        failures.append("backoff: retried a non-retryable error")
+    return failures
+
+
+def check_run(llm: ErrorInjectingLanguageModel, component: Any, products: List[Any], args: argparse.Namespace) -> List[str]:
+    failures = []
+    errors = [p.data.get("error") for p in products if "error" in p.data]
+    if errors:
+        failures.append(f"recovery: generation returned errors: {errors}")
+    retries = component.generation_metrics.snapshot().get("products", {}).get("retries", 0)
+    if retries != len(args.fail_calls):
+        failures.append(f"recovery: {retries} retries for {len(args.fail_calls)} injected 429s")
+    for failed in (entry for entry in llm.log if entry["failed"]):
+        early = [entry["start"] - failed["end"] for entry in llm.log if failed["end"] < entry["start"] < failed["end"] + args.retry_after]
+        if early:
+            failures.append(f"retry-after: a call started {min(early):.3f}s after a 429 asking for {args.retry_after}s")
+            break
+    limiter = component.get_rate_limiter()
+    if llm.peak > args.max_concurrency:
+        failures.append(f"window: {llm.peak} concurrent calls with max_concurrency {args.max_concurrency}")
+    if limiter.throttled != len(args.fail_calls):
+        failures.append(f"window: limiter counted {limiter.throttled} throttled calls for {len(args.fail_calls)} injected 429s")
+    windows = [entry["window"] for entry in llm.log if entry["window"] is not None]
+    if args.fail_calls and min(windows) > args.max_concurrency / 2:
+        failures.append(f"window: never shrank below {min(windows):.2f} after throttling")
+    if args.fail_calls and limiter.window <= min(windows):
+        failures.append(f"window: did not grow back after throttling ({limiter.window:.2f})")
+    return failures
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=200, help="products to generate")
+    parser.add_argument("--products-per-shard", type=int, default=10)
+    parser.add_argument("--max-concurrency", type=int, default=4)
+    parser.add_argument("--fail-calls", type=int, nargs="*", default=[4, 5, 6], help="0-based product calls answered with a 429")
+    parser.add_argument("--retry-after", type=float, default=0.2, help="retry-after hint of the injected 429s in seconds")
+    parser.add_argument("--latency", type=float, default=0.02, help="fake LLM latency per call in seconds")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    module = load_generator_module()
+    llm = ErrorInjectingLanguageModel(args.fail_calls, args.retry_after, latency=args.latency, seed=args.seed)
+    # A model name of its own so the process-wide limiter starts from a fresh window
+    llm.model_name = f"rate-limit-check-{os.getpid()}-{time.monotonic_ns()}"
+    with tempfile.TemporaryDirectory() as spill_dir:
+        component = make_component(
+            module, llm, spill_dir,
+            num_categories=5, num_products=args.products, products_per_shard=args.products_per_shard,
+            max_concurrency=args.max_concurrency,
+            max_retries=3, retry_base_delay=0.01, retry_max_delay=0.5,
+        )
+        llm.limiter = component.get_rate_limiter()
+        component.create_categories()
+        started = time.perf_counter()
+        products = component.create_products()
+        elapsed = time.perf_counter() - started
+    failures = check_backoff(component, args.retry_after) + check_run(llm, component, products, args)
+    print(f"{len(products)} products in {elapsed:.2f}s, {len(llm.log)} calls, peak concurrency {llm.peak}, final window {llm.limiter.window:.2f}")
+    print("\n".join(failures) or "All rate limiter checks passed")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
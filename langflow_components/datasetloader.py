@@ -0,0 +1,198 @@
+import json
+import mmap
+import os
+from array import array
+from collections.abc import Iterator
+
+from langflow.custom import Component
+from langflow.io import DropdownInput, IntInput, Output, StrInput
+from langflow.schema import Data
+
+INDEX_SUFFIX = ".idx"
+INDEX_FLUSH_ENTRIES = 65536
+
+
+class NDJSONOffsetIndex:
+    """Memory-mapped line-delimited JSON file with a sidecar index of record start offsets.
+
+    The index is a flat array of native uint64 offsets, one per non-empty line, followed by the data
+    file size. It is built once next to the data file and rebuilt when the data file changes.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.index_path = path + INDEX_SUFFIX
+        if not self._index_is_current():
+            self._build_index()
+        self._data_file = open(path, "rb")  # noqa: SIM115
+        self._index_file = open(self.index_path, "rb")  # noqa: SIM115
+        self._data = mmap.mmap(self._data_file.fileno(), 0, access=mmap.ACCESS_READ) if self._size() else None
+        self._index = mmap.mmap(self._index_file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._offsets = memoryview(self._index).cast("Q")
+
+    def _size(self) -> int:
+        return os.path.getsize(self.path)
+
+    def _index_is_current(self) -> bool:
+        if not os.path.exists(self.index_path) or os.path.getmtime(self.index_path) < os.path.getmtime(self.path):
+            return False
+        index_size = os.path.getsize(self.index_path)
+        if index_size < array("Q").itemsize or index_size % array("Q").itemsize:
+            return False
+        with open(self.index_path, "rb") as f:
+            f.seek(-array("Q").itemsize, os.SEEK_END)
+            sentinel = array("Q")
+            sentinel.frombytes(f.read())
+        return sentinel[0] == self._size()
+
+    def _build_index(self) -> None:
+        size = self._size()
+        partial_path = self.index_path + ".partial"
+        with open(self.path, "rb") as data_file, open(partial_path, "wb") as index_file:
+            offsets = array("Q")
+            if size:
+                with mmap.mmap(data_file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    position = 0
+                    while position < size:
+                        end = data.find(b"\n", position)
+                        if end == -1:
+                            end = size
+                        if data[position:end].strip():
+                            offsets.append(position)
+                            if len(offsets) >= INDEX_FLUSH_ENTRIES:
+                                offsets.tofile(index_file)
+                                offsets = array("Q")
+                        position = end + 1
+            offsets.append(size)
+            offsets.tofile(index_file)
+        os.replace(partial_path, self.index_path)
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def read(self, start: int, stop: int) -> Iterator[dict]:
+        for position in range(start, stop):
+            yield json.loads(self._data[self._offsets[position] : self._offsets[position + 1]])
+
+    def close(self) -> None:
+        self._offsets.release()
+        self._index.close()
+        if self._data is not None:
+            self._data.close()
+        self._index_file.close()
+        self._data_file.close()
+
+
+class ArrowIPCFile:
+    """Memory-mapped Arrow IPC file whose record batches are read zero-copy on demand."""
+
+    def __init__(self, path: str):
+        try:
+            import pyarrow as pa
+            import pyarrow.ipc as ipc
+        except ImportError as e:
+            msg = "Please install pyarrow to load Arrow IPC datasets."
+            raise ImportError(msg) from e
+        self._source = pa.memory_map(path, "r")
+        self._reader = ipc.open_file(self._source)
+        self._batch_starts = [0]
+        for batch_index in range(self._reader.num_record_batches):
+            self._batch_starts.append(self._batch_starts[-1] + self._reader.get_batch(batch_index).num_rows)
+
+    def __len__(self) -> int:
+        return self._batch_starts[-1]
+
+    def read(self, start: int, stop: int) -> Iterator[dict]:
+        for batch_index in range(self._reader.num_record_batches):
+            batch_start, batch_stop = self._batch_starts[batch_index], self._batch_starts[batch_index + 1]
+            if batch_stop <= start:
+                continue
+            if batch_start >= stop:
+                break
+            batch = self._reader.get_batch(batch_index)
+            offset = max(start - batch_start, 0)
+            yield from batch.slice(offset, min(stop, batch_stop) - batch_start - offset).to_pylist()
+
+    def close(self) -> None:
+        self._source.close()
+
+
+class DatasetLoaderComponent(Component):
+    display_name = "Dataset Loader"
+    description = "Page through a pre-generated catalog without loading it into memory."
+    icon = "database"
+    name = "DatasetLoader"
+
+    inputs = [
+        StrInput(
+            name="file_path",
+            display_name="File Path",
+            info="Arrow IPC (.arrow, .feather) or line-delimited JSON (.ndjson, .jsonl) file to read.",
+        ),
+        DropdownInput(
+            name="file_format",
+            display_name="File Format",
+            options=["auto", "arrow", "ndjson"],
+            value="auto",
+            advanced=True,
+            info="Detect the format from the file extension, or force Arrow IPC or line-delimited JSON.",
+        ),
+        IntInput(
+            name="offset",
+            display_name="Offset",
+            value=0,
+            info="Index of the first record in the slice.",
+        ),
+        IntInput(
+            name="limit",
+            display_name="Limit",
+            value=1000,
+            info="Maximum number of records in the slice, 0 reads to the end of the file.",
+        ),
+    ]
+
+    outputs = [
+        Output(
+            display_name="Data",
+            name="data",
+            info="One Data per record in the requested slice.",
+            method="load_records",
+        ),
+    ]
+
+    def _detect_format(self) -> str:
+        if self.file_format != "auto":
+            return self.file_format
+        extension = os.path.splitext(self.file_path)[1].lower()
+        if extension in {".arrow", ".feather", ".ipc"}:
+            return "arrow"
+        if extension in {".ndjson", ".jsonl", ".ldjson"}:
+            return "ndjson"
+        msg = f"Cannot detect the dataset format of {self.file_path}, choose it explicitly."
+        raise ValueError(msg)
+
+    def open_dataset(self) -> NDJSONOffsetIndex | ArrowIPCFile:
+        path = os.path.expanduser(self.file_path or "")
+        if not os.path.isfile(path):
+            msg = f"Dataset file not found: {self.file_path}"
+            raise ValueError(msg)
+        if self._detect_format() == "arrow":
+            return ArrowIPCFile(path)
+        return NDJSONOffsetIndex(path)
+
+    def iter_records(self, start: int = 0, stop: int | None = None) -> Iterator[Data]:
+        """Yields Data for records [start, stop) while only the current record is decoded."""
+        dataset = self.open_dataset()
+        try:
+            stop = len(dataset) if stop is None else min(stop, len(dataset))
+            for record in dataset.read(max(start, 0), stop):
+                yield Data(data=record)
+        finally:
+            dataset.close()
+
+    def load_records(self) -> list[Data]:
+        start = max(self.offset or 0, 0)
+        stop = start + self.limit if self.limit and self.limit > 0 else None
+        records = list(self.iter_records(start, stop))
+        self.status = f"Loaded {len(records)} records starting at {start}"
+        return records
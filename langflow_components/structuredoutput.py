@@ -1,16 +1,60 @@
-from typing import TYPE_CHECKING, cast
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, cast
 
 from pydantic import BaseModel, Field, create_model
 
 from langflow.base.models.chat_result import get_chat_result
 from langflow.custom import Component
 from langflow.helpers.base_model import build_model_from_schema
-from langflow.io import BoolInput, HandleInput, MessageTextInput, Output, StrInput, TableInput
+from langflow.io import BoolInput, HandleInput, IntInput, MessageTextInput, Output, StrInput, TableInput
 from langflow.schema.data import Data
+from langflow.schema.message import Message
 
 if TYPE_CHECKING:
     from langflow.field_typing.constants import LanguageModel
 
+OUTPUT_MODEL_CACHE_SIZE = 256
+
+
+class LRUCache:
+    """Thread-safe mapping that evicts the least recently used entry once it holds more than maxsize entries."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Any) -> Any:
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def put(self, key: Any, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+
+# Shared by every component instance in the process
+OUTPUT_MODEL_CACHE = LRUCache(OUTPUT_MODEL_CACHE_SIZE)
+
+
+def output_schema_key(output_schema: Any, schema_name: str, multiple: Any) -> str:
+    """Canonical hash of everything the output model is built from."""
+    payload = json.dumps(
+        {"output_schema": output_schema, "schema_name": schema_name, "multiple": bool(multiple)},
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
 
 class StructuredOutputComponent(Component):
     display_name = "Structured Output"
@@ -32,9 +76,8 @@ class StructuredOutputComponent(Component):
         MessageTextInput(
             name="input_value",
             display_name="Input Message",
-            info="The input message to the language model.",
+            info="The input message to the language model. Required for Structured Output; Batch Output uses Batch Inputs.",
             tool_mode=True,
-            required=True,
         ),
         StrInput(
             name="schema_name",
@@ -87,13 +130,28 @@ class StructuredOutputComponent(Component):
             display_name="Generate Multiple",
             info="Set to True if the model should generate a list of outputs instead of a single output.",
         ),
+        HandleInput(
+            name="batch_inputs",
+            display_name="Batch Inputs",
+            info="Messages or Data to structure in one run for the Batch Output, one result per input.",
+            input_types=["Message", "Data"],
+            is_list=True,
+        ),
+        IntInput(
+            name="max_concurrency",
+            display_name="Max Concurrency",
+            info="Maximum number of batch inputs sent to the language model at the same time.",
+            value=8,
+            advanced=True,
+        ),
     ]
 
     outputs = [
         Output(name="structured_output", display_name="Structured Output", method="build_structured_output"),
+        Output(name="batch_output", display_name="Batch Output", method="build_batch_output"),
     ]
 
-    def build_structured_output(self) -> Data:
+    def _build_structured_llm(self) -> Any:
         schema_name = self.schema_name or "OutputModel"
 
         if not hasattr(self.llm, "with_structured_output"):
@@ -103,29 +161,79 @@ class StructuredOutputComponent(Component):
             msg = "Output schema cannot be empty"
             raise ValueError(msg)
 
-        output_model_ = build_model_from_schema(self.output_schema)
-        if self.multiple:
-            output_model = create_model(
-                schema_name,
-                objects=(list[output_model_], Field(description=f"A list of {schema_name}.")),  # type: ignore[valid-type]
-            )
-        else:
-            output_model = output_model_
+        key = output_schema_key(self.output_schema, schema_name, self.multiple)
+        output_model = OUTPUT_MODEL_CACHE.get(key)
+        if output_model is None:
+            output_model_ = build_model_from_schema(self.output_schema)
+            if self.multiple:
+                output_model = create_model(
+                    schema_name,
+                    objects=(list[output_model_], Field(description=f"A list of {schema_name}.")),  # type: ignore[valid-type]
+                )
+            else:
+                output_model = output_model_
+            OUTPUT_MODEL_CACHE.put(key, output_model)
+
         try:
             llm_with_structured_output = cast("LanguageModel", self.llm).with_structured_output(schema=output_model)  # type: ignore[valid-type, attr-defined]
-
         except NotImplementedError as exc:
             msg = f"{self.llm.__class__.__name__} does not support structured output."
             raise TypeError(msg) from exc
-        config_dict = {
+        return llm_with_structured_output
+
+    def _get_config(self) -> dict:
+        return {
             "run_name": self.display_name,
             "project_name": self.get_project_name(),
             "callbacks": self.get_langchain_callbacks(),
         }
-        output = get_chat_result(runnable=llm_with_structured_output, input_value=self.input_value, config=config_dict)
+
+    def build_structured_output(self) -> Data:
+        if not self.input_value:
+            msg = "Input message cannot be empty"
+            raise ValueError(msg)
+        llm_with_structured_output = self._build_structured_llm()
+        output = get_chat_result(
+            runnable=llm_with_structured_output, input_value=self.input_value, config=self._get_config()
+        )
         if isinstance(output, BaseModel):
             output_dict = output.model_dump()
         else:
             msg = f"Output should be a Pydantic BaseModel, got {type(output)} ({output})"
             raise TypeError(msg)
         return Data(data=output_dict)
+
+    @staticmethod
+    def _batch_input_text(item: Any) -> str:
+        if isinstance(item, Message):
+            return item.text or ""
+        if isinstance(item, Data):
+            return item.get_text() or json.dumps(item.data, default=str)
+        return str(item)
+
+    async def build_batch_output(self) -> list[Data]:
+        """Structures every batch input with abatch, returning one Data per input in input order.
+
+        Inputs that fail keep their position and carry the error instead of failing the whole batch.
+        """
+        items = self.batch_inputs if isinstance(self.batch_inputs, list) else [self.batch_inputs]
+        items = [item for item in items if item is not None]
+        if not items:
+            msg = "Batch inputs cannot be empty"
+            raise ValueError(msg)
+        llm_with_structured_output = self._build_structured_llm()
+        config = {**self._get_config(), "max_concurrency": max(1, self.max_concurrency or 1)}
+        outputs = await llm_with_structured_output.abatch(
+            [self._batch_input_text(item) for item in items], config=config, return_exceptions=True
+        )
+        results: list[Data] = []
+        for index, output in enumerate(outputs):
+            if isinstance(output, BaseModel):
+                results.append(Data(data=output.model_dump()))
+                continue
+            if not isinstance(output, Exception):
+                output = TypeError(f"Output should be a Pydantic BaseModel, got {type(output)}")
+            results.append(Data(data={"index": index, "error": f"{type(output).__name__}: {output}"}))
+        failed = sum(1 for result in results if "error" in result.data)
+        self.status = f"Structured {len(results) - failed} of {len(results)} inputs, {failed} failed"
+        return results
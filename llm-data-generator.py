@@ -1,72 +1,38 @@
 from langflow.custom import Component
 from langflow.io import Output
 from langflow.schema import Data
+from langflow.schema.message import Message
 from langflow.logging import logger
-from langflow.inputs import IntInput, StrInput, HandleInput
+from langflow.inputs import IntInput, StrInput, HandleInput, BoolInput, DropdownInput, FloatInput, DictInput
 from langflow.io import Output
-from langchain.schema import HumanMessage
-from typing import List, Dict
+from langchain.schema import HumanMessage, SystemMessage
+from pydantic import Field, create_model
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from functools import partial
+from typing import Any, AsyncIterator, Awaitable, Callable, Iterable, Iterator, List, Dict, Optional
+import asyncio
+import hashlib
 import json
+import math
+import os
+import random
 import re
+import shutil
+import sqlite3
+import string
+import sys
+import tempfile
+import threading
+import time
+import uuid
+import weakref
+import zlib
+from datetime import date, timedelta
 
 
-class CustomComponent(Component):
-    display_name = "eComm Data Generator"
-    description = "Use as a template to create your own component."
-    documentation: str = "http://docs.langflow.org/components/custom"
-    icon = "code"
-    name = "ecomm-data-generator"
-    inputs = [
-        StrInput(name="store_theme", display_name="Theme", value="Consumer Electronics"),
-        IntInput(name="num_categories", display_name="Categories", value=10),
-        IntInput(name="num_products", display_name="Products", value=100),
-        IntInput(name="num_users", display_name="Users", value=10),
-        HandleInput(name="llm", display_name="Language Model", input_types=["LanguageModel"], info="Connect to a Language Model component"),
-    ]
-    outputs = [
-        Output(name="categories_dataset", display_name="Categories", method="create_categories"),
-        Output(name="products_dataset", display_name="Products", method="create_products"),
-        Output(name="users_dataset", display_name="Users", method="create_users"),
-    ]
-    llog = logger
-    all_categories: List[Data] = []
-    all_products: List[Data] = []
-    all_users: List[Data] = []
-    def generate_category_prompt(self) -> str:
-        return (
-            f"Generate a list of '{self.num_categories}' unique, creative, and diverse top-level categories for an online marketplace focused on the theme of '{self.store_theme}'."
-            "Give each category a UUID, name, and description. These categories should be specific to the marketplace theme, but general enough to allow subcategories."
-            "For each category, create three subcategories. Each with their own UUID, name, and description. Also include the UUID of the parent category."
-            "Do not format your response as markdown, or include any other text other than properly formatted JSON."
-            "Do not truncate or shorten your response in any way. It is vital that your response only be valid JSON"
-            "Return the answer in JSON format and strictly adhere to the following JSON schema. The response must be a valid JSON array starting with '[' and ending with ']'"
-            """
-            {
-                "id" : "string",
-                "name" : "string",
-                "description" : "string",
-                "subcategories" : [
-                    {
-                        "id" : "string",
-                        "name" : "string",
-                        "description" : "string",
-                        "parent_id" : "string"
-                    }
-                ],
-                "error" : "string (optional, only if the request cannot be fulfilled)"
-            }
-            """
-            "If you don't know how to answer or have issues, please return an error message in JSON"
-        )
-    def generate_products_prompt(self, category_info: List[Dict]) -> str:
-        return (
-            f"Generate a list of {self.num_products} products for an online marketplace focused on {self.store_theme}. "
-            "Return a JSON array where each element represents a product. "
-            f"Use only the following categories:\n{json.dumps(category_info, indent=2)}\n"
-            "The response must be a valid JSON array starting with '[' and ending with ']'. Do not format your response as markdown, or include any other text other than properly formatted JSON."
-            "Do not truncate or shorten your response in any way. It is vital that your response only be valid JSON"
-            "Each product object in the array must follow this exact schema:"
-            """
+PRODUCT_SCHEMA = """
             [
                 {
                     "id": "string",
@@ -99,21 +65,25 @@ class CustomComponent(Component):
                 }
             ]
             """
-        )
-    def generate_users_prompt(self, category_info: List[Dict], product_info: List[Dict]) -> str:
-        return (
-            f"Generate a list of {self.num_users} realistic user profiles for an online marketplace "
-            f"focused on {self.store_theme}. "
-            "Return a JSON array where each element represents a user profile. "
-            f"Use only the following products and categories:\n"
-            f"Categories:\n{json.dumps(category_info, indent=2)}\n"
-            f"Products:\n{json.dumps(product_info[:10], indent=2)}...(more products available)\n"
-            "For each user, create a purchase history of 3-5 items from the available products list, "
-            "and a list of 2-3 favorite categories from the available categories. "
-            "The response must be a valid JSON array starting with '[' and ending with ']'. Do not format your response as markdown, or include any other text other than properly formatted JSON."
-            "Do not truncate or shorten your response in any way. It is vital that your response only be valid JSON"
-            "Each user object in the array must follow this exact schema:"
+HYBRID_PRODUCT_SCHEMA = """
+            [
+                {
+                    "id": "string",
+                    "name": "string",
+                    "description": "string",
+                    "category_id": "string",
+                    "subcategory_id": "string",
+                    "specifications": {
+                        "weight": "string",
+                        "dimensions": "string",
+                        "color": "string",
+                        "material": "string",
+                        "warranty": "string"
+                    }
+                }
+            ]
             """
+USER_SCHEMA = """
             [
                 {
                     "id": "string",
@@ -123,8 +93,30 @@ class CustomComponent(Component):
                     "purchase_history": [
                         {
                             "product_id": "string (must match a product from the provided list)",
-                            "purchase_date": "string (YYYY-MM-DD)",
-                            "price": "number (use actual price from product list)"
+                            "purchase_date": "string (YYYY-MM-DD)"
+                        }
+                    ],
+                    "favorite_categories": [
+                        {
+                            "category_id": "string (must match a category from the provided list)",
+                            "name": "string (use actual category name)"
+                        }
+                    ],
+                    "account_status": "string (one of: active, inactive)",
+                    "last_login": "string (YYYY-MM-DD)"
+                }
+            ]
+            """
+HYBRID_USER_SCHEMA = """
+            [
+                {
+                    "id": "string",
+                    "name": "string",
+                    "email": "string",
+                    "join_date": "string (YYYY-MM-DD)",
+                    "purchase_history": [
+                        {
+                            "product_id": "string (must match a product from the provided list)"
                         }
                     ],
                     "favorite_categories": [
@@ -133,17 +125,1755 @@ class CustomComponent(Component):
                             "name": "string (use actual category name)"
                         }
                     ],
-                    "total_spent": "number",
                     "account_status": "string (one of: active, inactive)",
                     "last_login": "string (YYYY-MM-DD)"
                 }
             ]
             """
+CATEGORY_SCHEMA = """
+            [
+                {
+                    "id" : "string",
+                    "name" : "string",
+                    "description" : "string",
+                    "subcategories" : [
+                        {
+                            "id" : "string",
+                            "name" : "string",
+                            "description" : "string",
+                            "parent_id" : "string"
+                        }
+                    ],
+                    "error" : "string (optional, only if the request cannot be fulfilled)"
+                }
+            ]
+            """
+# Id instructions per table: (rules, start) for short alias ids and for UUIDs
+ID_RULES = {
+    "categories": {
+        True: (
+            "Give each category a short sequential id (C1, C2, ...), a name, and a description. "
+            "For each category, create three subcategories. Each with their own id made of the category id, a dot and a number (for example C1.1, C1.2, C1.3), a name, and a description. Also include the id of the parent category.",
+            "Number the categories starting at C{start} (C{start}, C{next}, ...).",
+        ),
+        False: (
+            "Give each category a UUID, name, and description. "
+            "For each category, create three subcategories. Each with their own UUID, name, and description. Also include the UUID of the parent category.",
+            "",
+        ),
+    },
+    "products": {
+        True: ("Give each product a short sequential id (P1, P2, ...).", "Number the products starting at P{start} (P{start}, P{next}, ...)."),
+        False: ("", ""),
+    },
+    "users": {
+        True: ("Give each user a short sequential id (U1, U2, ...).", "Number the users starting at U{start} (U{start}, U{next}, ...)."),
+        False: ("", ""),
+    },
+}
+PROMPT_CALL_MARKER = "<!-- per-call -->"
+# Built-in prompt templates, the same text as llm_prompts/*.md; a file of the same name in the Prompt Directory overrides one
+DEFAULT_PROMPT_TEMPLATES = {
+    "categoryprompt": """You are creating the category tree of an online marketplace focused on the theme of '{store_theme}'.
+{id_rules}
+These categories should be specific to the marketplace theme, but general enough to allow subcategories.
+Do not format your response as markdown, or include any other text other than properly formatted JSON.
+Do not truncate or shorten your response in any way. It is vital that your response only be valid JSON.
+Return the answer in JSON format and strictly adhere to the following JSON schema. The response must be a valid JSON array starting with '[' and ending with ']'
+{schema}
+If you don't know how to answer or have issues, please return an error message in JSON.
+<!-- per-call -->
+Generate a list of '{count}' unique, creative, and diverse top-level categories for an online marketplace focused on the theme of '{store_theme}'. {id_start}
+""",
+    "productprompt": """You are creating the product catalog of an online marketplace focused on {store_theme}.
+Return a JSON array where each element represents a product. {id_rules}
+Use only the categories and subcategories listed with each request. {context_notes}
+The response must be a valid JSON array starting with '[' and ending with ']'. Do not format your response as markdown, or include any other text other than properly formatted JSON.
+Do not truncate or shorten your response in any way. It is vital that your response only be valid JSON.
+Each product object in the array must follow this exact schema:
+{schema}
+<!-- per-call -->
+Use only the following categories:
+{category_context}
+Generate a list of {count} products for an online marketplace focused on {store_theme}. {id_start}
+{chunk_note}
+""",
+    "userprompt": """You are creating the customer base of an online marketplace focused on {store_theme}.
+Return a JSON array where each element represents a user profile. {id_rules}
+Use only the products and categories listed with each request. {context_notes}
+For each user, create a purchase history of 3-5 items from the available products list, and a list of 2-3 favorite categories from the available categories.
+The response must be a valid JSON array starting with '[' and ending with ']'. Do not format your response as markdown, or include any other text other than properly formatted JSON.
+Do not truncate or shorten your response in any way. It is vital that your response only be valid JSON.
+Each user object in the array must follow this exact schema:
+{schema}
+<!-- per-call -->
+Categories:
+{category_context}
+Products:
+{product_context}...(more products available)
+Generate a list of {count} realistic user profiles for an online marketplace focused on {store_theme}. {id_start}
+""",
+}
+# Record fields as output schema rows (name, type, description, multiple), as used by build_model_from_schema;
+# a list of rows as the type declares a nested object
+SUBCATEGORY_FIELDS = [
+    {"name": "id", "type": "str", "description": "Subcategory id", "multiple": False},
+    {"name": "name", "type": "str", "description": "Subcategory name", "multiple": False},
+    {"name": "description", "type": "str", "description": "Subcategory description", "multiple": False},
+    {"name": "parent_id", "type": "str", "description": "Id of the parent category", "multiple": False},
+]
+CATEGORY_FIELDS = [
+    {"name": "id", "type": "str", "description": "Category id", "multiple": False},
+    {"name": "name", "type": "str", "description": "Category name", "multiple": False},
+    {"name": "description", "type": "str", "description": "Category description", "multiple": False},
+    {"name": "subcategories", "type": SUBCATEGORY_FIELDS, "description": "Three subcategories of the category", "multiple": True},
+]
+SPECIFICATION_FIELDS = [
+    {"name": "weight", "type": "str", "description": "Product weight", "multiple": False},
+    {"name": "dimensions", "type": "str", "description": "Length by width by height", "multiple": False},
+    {"name": "color", "type": "str", "description": "Product color", "multiple": False},
+    {"name": "material", "type": "str", "description": "Materials used to make the product", "multiple": False},
+    {"name": "warranty", "type": "str", "description": "Warranty terms", "multiple": False},
+]
+HYBRID_PRODUCT_FIELDS = [
+    {"name": "id", "type": "str", "description": "Product id", "multiple": False},
+    {"name": "name", "type": "str", "description": "Product name", "multiple": False},
+    {"name": "description", "type": "str", "description": "Product description", "multiple": False},
+    {"name": "category_id", "type": "str", "description": "Id of a category from the provided list", "multiple": False},
+    {"name": "subcategory_id", "type": "str", "description": "Id of a subcategory from the provided list", "multiple": False},
+    {"name": "specifications", "type": SPECIFICATION_FIELDS, "description": "Product specifications", "multiple": False},
+]
+PRODUCT_FIELDS = HYBRID_PRODUCT_FIELDS[:5] + [
+    {"name": "price", "type": "float", "description": "Price in US dollars", "multiple": False},
+    HYBRID_PRODUCT_FIELDS[5],
+    {"name": "inventory", "type": [
+        {"name": "stock_count", "type": "int", "description": "Units in stock", "multiple": False},
+        {"name": "sku", "type": "str", "description": "Stock keeping unit", "multiple": False},
+        {"name": "warehouse_location", "type": "str", "description": "City and state of the warehouse", "multiple": False},
+    ], "description": "Inventory details", "multiple": False},
+    {"name": "ratings", "type": [
+        {"name": "average_score", "type": "float", "description": "Average rating from 1 to 5", "multiple": False},
+        {"name": "review_count", "type": "int", "description": "Number of reviews", "multiple": False},
+    ], "description": "Customer ratings", "multiple": False},
+    {"name": "shipping_info", "type": [
+        {"name": "free_shipping", "type": "bool", "description": "Whether shipping is free", "multiple": False},
+        {"name": "shipping_weight", "type": "str", "description": "Shipping weight", "multiple": False},
+        {"name": "handling_time", "type": "str", "description": "Handling time before shipping", "multiple": False},
+    ], "description": "Shipping details", "multiple": False},
+]
+FAVORITE_CATEGORY_FIELDS = [
+    {"name": "category_id", "type": "str", "description": "Id of a category from the provided list", "multiple": False},
+    {"name": "name", "type": "str", "description": "Actual name of the category", "multiple": False},
+]
+HYBRID_PURCHASE_FIELDS = [
+    {"name": "product_id", "type": "str", "description": "Id of a product from the provided list", "multiple": False},
+]
+PURCHASE_FIELDS = HYBRID_PURCHASE_FIELDS + [
+    {"name": "purchase_date", "type": "str", "description": "Purchase date as YYYY-MM-DD", "multiple": False},
+]
+HYBRID_USER_FIELDS = [
+    {"name": "id", "type": "str", "description": "User id", "multiple": False},
+    {"name": "name", "type": "str", "description": "Full name", "multiple": False},
+    {"name": "email", "type": "str", "description": "Email address", "multiple": False},
+    {"name": "join_date", "type": "str", "description": "Join date as YYYY-MM-DD", "multiple": False},
+    {"name": "purchase_history", "type": HYBRID_PURCHASE_FIELDS, "description": "Three to five purchases", "multiple": True},
+    {"name": "favorite_categories", "type": FAVORITE_CATEGORY_FIELDS, "description": "Two or three favorite categories", "multiple": True},
+    {"name": "account_status", "type": "str", "description": "One of: active, inactive", "multiple": False},
+    {"name": "last_login", "type": "str", "description": "Last login date as YYYY-MM-DD", "multiple": False},
+]
+USER_FIELDS = [{**field, "type": PURCHASE_FIELDS} if field["name"] == "purchase_history" else field for field in HYBRID_USER_FIELDS]
+# Record fields per table, for regular and hybrid synthesis
+RECORD_FIELDS = {
+    "categories": {False: CATEGORY_FIELDS, True: CATEGORY_FIELDS},
+    "products": {False: PRODUCT_FIELDS, True: HYBRID_PRODUCT_FIELDS},
+    "users": {False: USER_FIELDS, True: HYBRID_USER_FIELDS},
+}
+RECORD_FIELD_TYPES = {"str": str, "text": str, "int": int, "float": float, "bool": bool, "dict": dict}
+HANDLING_TIMES = ["1 business day", "1-2 business days", "2-3 business days", "3-5 business days"]
+WAREHOUSE_LOCATIONS = [
+    "Reno, NV", "Columbus, OH", "Dallas, TX", "Atlanta, GA", "Allentown, PA",
+    "Phoenix, AZ", "Indianapolis, IN", "Sacramento, CA", "Jacksonville, FL", "Kent, WA",
+]
+
+
+class NumericFieldSampler:
+    """
+    Seeded batch samplers for numeric and structured dataset fields.
+    Uses NumPy's vectorized generator when it is installed and the standard library otherwise;
+    results are reproducible for a given seed and backend.
+    """
+    def __init__(self, seed: int):
+        try:
+            import numpy as np
+        except ImportError:
+            np = None
+        self.np = np
+        self.rng = np.random.default_rng(seed) if np is not None else random.Random(seed)
+    def uniform(self, size: int) -> List[float]:
+        if self.np is not None:
+            return self.rng.random(size).tolist()
+        return [self.rng.random() for _ in range(size)]
+    def log_uniform(self, lows: List[float], highs: List[float]) -> List[float]:
+        if self.np is not None:
+            low, high = self.np.log(self.np.asarray(lows)), self.np.log(self.np.asarray(highs))
+            return self.np.exp(low + (high - low) * self.rng.random(len(lows))).tolist()
+        return [math.exp(math.log(lo) + (math.log(hi) - math.log(lo)) * self.rng.random()) for lo, hi in zip(lows, highs)]
+    def lognormal(self, size: int, mean: float, sigma: float) -> List[float]:
+        if self.np is not None:
+            return self.rng.lognormal(mean, sigma, size).tolist()
+        return [self.rng.lognormvariate(mean, sigma) for _ in range(size)]
+    def zipf(self, size: int, exponent: float, cap: int) -> List[int]:
+        """
+        Zipf-distributed counts starting at 1 and capped at cap
+        """
+        if self.np is not None:
+            return self.np.minimum(self.rng.zipf(exponent, size), cap).tolist()
+        # Inverse transform of the continuous Pareto approximation
+        return [min(int((1.0 - self.rng.random()) ** (-1.0 / (exponent - 1.0))), cap) for _ in range(size)]
+    def beta(self, size: int, alpha: float, beta: float) -> List[float]:
+        if self.np is not None:
+            return self.rng.beta(alpha, beta, size).tolist()
+        return [self.rng.betavariate(alpha, beta) for _ in range(size)]
+    def choice(self, options: List[Any], size: int) -> List[Any]:
+        if self.np is not None:
+            return [options[index] for index in self.rng.integers(0, len(options), size).tolist()]
+        return [self.rng.choice(options) for _ in range(size)]
+
+
+class IncrementalJSONArrayParser:
+    """
+    Incremental parser for a JSON array that arrives in chunks.
+    feed() returns every top-level element whose closing bracket has arrived, so only the
+    element currently being received is buffered. Text before the opening '[' is skipped.
+    """
+    _STRUCTURAL = re.compile(r'["{}\[\]]')
+    _STRING_SPECIAL = re.compile(r'["\\]')
+    def __init__(self):
+        self.started = False
+        self.closed = False
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.objects_parsed = 0
+        self.objects_invalid = 0
+        self._buffer: List[str] = []
+    def feed(self, chunk: str) -> List[Any]:
+        records: List[Any] = []
+        pos = 0
+        length = len(chunk)
+        segment_start: Optional[int] = 0 if self.depth > 0 else None
+        while pos < length and not self.closed:
+            if not self.started:
+                start_idx = chunk.find('[', pos)
+                if start_idx == -1:
+                    break
+                self.started = True
+                pos = start_idx + 1
+                continue
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                    pos += 1
+                    continue
+                match = self._STRING_SPECIAL.search(chunk, pos)
+                if match is None:
+                    break
+                if match.group() == '\\':
+                    self.escaped = True
+                else:
+                    self.in_string = False
+                pos = match.end()
+                continue
+            match = self._STRUCTURAL.search(chunk, pos)
+            if match is None:
+                break
+            char = match.group()
+            pos = match.end()
+            if char == '"':
+                self.in_string = True
+            elif char in '{[':
+                if self.depth == 0:
+                    segment_start = match.start()
+                    self._buffer = []
+                self.depth += 1
+            elif self.depth == 0:
+                # Closing bracket of the top-level array
+                self.closed = char == ']'
+            else:
+                self.depth -= 1
+                if self.depth == 0:
+                    self._buffer.append(chunk[segment_start:pos])
+                    segment_start = None
+                    text = "".join(self._buffer)
+                    self._buffer = []
+                    try:
+                        records.append(json.loads(text))
+                        self.objects_parsed += 1
+                    except json.JSONDecodeError:
+                        self.objects_invalid += 1
+        if segment_start is not None and self.depth > 0:
+            self._buffer.append(chunk[segment_start:])
+        return records
+
+
+class LLMResponseCache:
+    """
+    Content-addressed SQLite cache of LLM responses.
+    Values are stored zlib-compressed and evicted least-recently-used once the total size exceeds max_bytes.
+    """
+    def __init__(self, directory: str, max_bytes: int):
+        self.path = os.path.join(os.path.expanduser(directory), "llm_responses.sqlite3")
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with self._lock, closing(self._connect()) as conn, conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses "
+                "(key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)")
+    @staticmethod
+    def make_key(model: Dict, prompt: str, chunk: str = "") -> str:
+        """
+        chunk names the chunk a prompt was sent for, so chunks that deliberately send the same prompt get their own responses
+        """
+        payload = json.dumps({"model": model, "prompt": prompt, "chunk": chunk}, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+    def get(self, key: str) -> Optional[str]:
+        with self._lock, closing(self._connect()) as conn, conn:
+            row = conn.execute("SELECT value FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key))
+        return zlib.decompress(row[0]).decode("utf-8")
+    def put(self, key: str, value: str) -> None:
+        blob = zlib.compress(value.encode("utf-8"))
+        with self._lock, closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+                (key, blob, len(blob), time.time()),
+            )
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            for old_key, size in conn.execute("SELECT key, size FROM responses ORDER BY last_access").fetchall():
+                if total <= self.max_bytes:
+                    break
+                conn.execute("DELETE FROM responses WHERE key = ?", (old_key,))
+                total -= size
+
+
+_RESPONSE_CACHES: Dict[tuple, LLMResponseCache] = {}
+_RESPONSE_CACHES_LOCK = threading.Lock()
+
+
+def get_response_cache(directory: str, max_bytes: int) -> LLMResponseCache:
+    """
+    Returns the process-wide cache for a directory so every component instance shares one handle
+    """
+    key = (os.path.abspath(os.path.expanduser(directory)), max_bytes)
+    with _RESPONSE_CACHES_LOCK:
+        if key not in _RESPONSE_CACHES:
+            _RESPONSE_CACHES[key] = LLMResponseCache(directory, max_bytes)
+        return _RESPONSE_CACHES[key]
+
+
+class PromptTemplate:
+    """
+    Prompt file compiled once into literal and {placeholder} segments.
+    The text before PROMPT_CALL_MARKER is the static prefix: it only uses run settings, is rendered once per
+    distinct settings and then returned as the same string, so every call starts with a byte-identical prefix.
+    The text after the marker holds the per-call values and is the only part rendered for each prompt; it starts
+    with the catalog context, which stays the same across the chunks of a stage, and ends with the per-call request.
+    """
+    def __init__(self, name: str, text: str):
+        static, marker, per_call = text.partition(PROMPT_CALL_MARKER)
+        if not marker:
+            raise ValueError(f"Prompt template {name} has no {PROMPT_CALL_MARKER} line separating the static prefix")
+        self.name = name
+        self.static_segments = self.compile(static.strip())
+        self.call_segments = self.compile(per_call.strip())
+        self.static_fields = tuple(dict.fromkeys(field for _, field in self.static_segments if field))
+        self._prefixes: Dict[tuple, str] = {}
+        self._lock = threading.Lock()
+    @staticmethod
+    def compile(text: str) -> List[tuple[str, Optional[str]]]:
+        return [(literal, field) for literal, field, _, _ in string.Formatter().parse(text)]
+    def fill(self, segments: List[tuple[str, Optional[str]]], values: Dict[str, Any]) -> str:
+        parts = []
+        for literal, field in segments:
+            parts.append(literal)
+            if field:
+                if field not in values:
+                    raise ValueError(f"Prompt template {self.name} needs a value for {{{field}}}")
+                parts.append(str(values[field]))
+        return "".join(parts)
+    def prefix(self, values: Dict[str, Any]) -> str:
+        key = tuple(str(values.get(field)) for field in self.static_fields)
+        with self._lock:
+            if key not in self._prefixes:
+                if len(self._prefixes) >= 64:
+                    self._prefixes.clear()
+                self._prefixes[key] = self.fill(self.static_segments, values) + "\n"
+            return self._prefixes[key]
+    def render(self, **values: Any) -> str:
+        return self.prefix(values) + self.fill(self.call_segments, values)
+    def match_prefix(self, prompt: str) -> Optional[str]:
+        with self._lock:
+            return next((prefix for prefix in self._prefixes.values() if prompt.startswith(prefix)), None)
+
+
+class PromptRegistry:
+    """
+    Prompt templates compiled on first use: the built-in DEFAULT_PROMPT_TEMPLATES, each overridden by a
+    {name}.md file of the same name when a directory is given and holds one
+    """
+    def __init__(self, directory: str = ""):
+        self.directory = os.path.abspath(os.path.expanduser(directory)) if directory else ""
+        self._templates: Dict[str, PromptTemplate] = {}
+        self._lock = threading.Lock()
+    def get(self, name: str) -> PromptTemplate:
+        with self._lock:
+            if name not in self._templates:
+                path = os.path.join(self.directory, f"{name}.md") if self.directory else ""
+                if path and os.path.isfile(path):
+                    with open(path, encoding="utf-8") as f:
+                        text = f.read()
+                elif name in DEFAULT_PROMPT_TEMPLATES:
+                    text = DEFAULT_PROMPT_TEMPLATES[name]
+                else:
+                    raise ValueError(f"Prompt template {name}.md not found in {self.directory or 'the built-in templates'}")
+                self._templates[name] = PromptTemplate(name, text)
+            return self._templates[name]
+    def match_prefix(self, prompt: str) -> Optional[str]:
+        """
+        Returns: the rendered static prefix the prompt starts with, or None for prompts not rendered from a template
+        """
+        with self._lock:
+            templates = list(self._templates.values())
+        return next((prefix for prefix in (t.match_prefix(prompt) for t in templates) if prefix), None)
+
+
+def prompt_prefix_hash(prefix: str) -> str:
+    return hashlib.sha256(prefix.encode("utf-8")).hexdigest()[:16]
+
+
+_PROMPT_REGISTRIES: Dict[str, PromptRegistry] = {}
+_PROMPT_REGISTRIES_LOCK = threading.Lock()
+
+
+def get_prompt_registry(directory: str) -> PromptRegistry:
+    """
+    Returns the process-wide registry for a prompt directory, "" for the built-in templates, so templates are
+    read and compiled once
+    """
+    key = os.path.abspath(os.path.expanduser(directory)) if directory else ""
+    with _PROMPT_REGISTRIES_LOCK:
+        if key not in _PROMPT_REGISTRIES:
+            _PROMPT_REGISTRIES[key] = PromptRegistry(key)
+        return _PROMPT_REGISTRIES[key]
+
+
+def build_record_model(name: str, fields: List[Dict]) -> Any:
+    """
+    Pydantic model for output schema rows the way build_model_from_schema builds one, plus nested objects
+    """
+    definitions: Dict[str, Any] = {}
+    for field in fields:
+        if isinstance(field["type"], list):
+            field_type = build_record_model(name + field["name"].title().replace("_", ""), field["type"])
+        else:
+            field_type = RECORD_FIELD_TYPES[field["type"]]
+        if field.get("multiple"):
+            field_type = List[field_type]
+        definitions[field["name"]] = (field_type, Field(description=field.get("description", "")))
+    return create_model(name, **definitions)
+
+
+_RECORD_MODELS: Dict[tuple, Any] = {}
+_RECORD_MODELS_LOCK = threading.Lock()
+
+
+def get_record_list_model(table: str, hybrid: bool) -> Any:
+    """
+    Returns the process-wide structured output model of a table, an object whose records field holds the
+    generated records since tool calling and JSON schema modes expect an object at the top level
+    """
+    key = (table, hybrid)
+    with _RECORD_MODELS_LOCK:
+        if key not in _RECORD_MODELS:
+            name = {"categories": "Category", "products": "Product", "users": "User"}[table]
+            record_model = build_record_model(name, RECORD_FIELDS[table][hybrid])
+            _RECORD_MODELS[key] = create_model(f"{name}List", records=(List[record_model], Field(description=f"The generated {table}")))
+        return _RECORD_MODELS[key]
+
+
+class RateLimitScheduler:
+    """
+    Token buckets for requests and tokens per minute plus an AIMD concurrency window, shared by every
+    call to one model in the process. A bucket whose quota is 0 is disabled, the window always applies.
+    Throttling halves the window and pauses new calls for the retry-after period; each successful call
+    grows the window again by about one slot per round.
+    """
+    def __init__(self, rpm: int, tpm: int, max_concurrency: int):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_concurrency = max(1, max_concurrency)
+        self.window = float(self.max_concurrency)
+        self.active = 0
+        self.throttled = 0
+        self.paused_until = 0.0
+        self._requests = float(rpm)
+        self._tokens = float(tpm)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+    def configure(self, rpm: int, tpm: int, max_concurrency: int) -> None:
+        with self._lock:
+            self.rpm, self.tpm = rpm, tpm
+            self.max_concurrency = max(1, max_concurrency)
+            self.window = min(self.window, float(self.max_concurrency))
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._updated
+        self._updated = now
+        if self.rpm > 0:
+            self._requests = min(float(self.rpm), self._requests + elapsed * self.rpm / 60.0)
+        if self.tpm > 0:
+            self._tokens = min(float(self.tpm), self._tokens + elapsed * self.tpm / 60.0)
+    def _try_acquire(self, tokens: int) -> float:
+        """
+        Takes a slot and the budget for one call if available
+        Returns: 0 when acquired, otherwise the number of seconds to wait before trying again
+        """
+        now = time.monotonic()
+        self._refill(now)
+        if now < self.paused_until:
+            return self.paused_until - now
+        if self.active >= int(self.window):
+            return 0.05
+        waits = []
+        if self.rpm > 0 and self._requests < 1:
+            waits.append((1 - self._requests) * 60.0 / self.rpm)
+        # A prompt larger than the whole budget only waits for a full bucket instead of forever
+        needed = min(tokens, self.tpm)
+        if self.tpm > 0 and self._tokens < needed:
+            waits.append((needed - self._tokens) * 60.0 / self.tpm)
+        if waits:
+            return max(waits)
+        if self.rpm > 0:
+            self._requests -= 1
+        if self.tpm > 0:
+            self._tokens -= tokens
+        self.active += 1
+        return 0.0
+    async def aacquire(self, tokens: int) -> None:
+        while True:
+            with self._lock:
+                wait = self._try_acquire(tokens)
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+    def release(self, completion_tokens: int = 0, throttled: bool = False, retry_after: Optional[float] = None) -> None:
+        """
+        Returns the slot of a finished call, charging its completion tokens and adapting the window
+        """
+        with self._lock:
+            self.active = max(0, self.active - 1)
+            if self.tpm > 0:
+                self._tokens -= completion_tokens
+            if throttled:
+                self.throttled += 1
+                self.window = max(1.0, self.window / 2)
+                if retry_after:
+                    self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+            else:
+                self.window = min(float(self.max_concurrency), self.window + 1.0 / self.window)
+
+
+_RATE_LIMITERS: Dict[str, RateLimitScheduler] = {}
+_RATE_LIMITERS_LOCK = threading.Lock()
+
+
+def get_rate_limiter(model_key: str, rpm: int, tpm: int, max_concurrency: int) -> RateLimitScheduler:
+    """
+    Returns the process-wide scheduler for a model so every component instance draws from one quota
+    """
+    with _RATE_LIMITERS_LOCK:
+        if model_key not in _RATE_LIMITERS:
+            _RATE_LIMITERS[model_key] = RateLimitScheduler(rpm, tpm, max_concurrency)
+        limiter = _RATE_LIMITERS[model_key]
+        limiter.configure(rpm, tpm, max_concurrency)
+        return limiter
+
+
+RETRYABLE_STATUS_CODES = {408, 409, 425, 429, 500, 502, 503, 504, 529}
+STRUCTURED_REJECTION_HINTS = ("schema", "tool", "function", "response_format", "structured")
+RETRYABLE_ERROR_NAMES = ("RateLimit", "Timeout", "APIConnectionError", "ServiceUnavailable", "InternalServerError", "Overloaded")
+
+
+def error_status_code(error: Exception) -> Optional[int]:
+    for candidate in (error, getattr(error, "response", None)):
+        for attr in ("status_code", "http_status", "status"):
+            value = getattr(candidate, attr, None)
+            if isinstance(value, int):
+                return value
+    return None
+
+
+def is_structured_output_rejection(error: Any) -> bool:
+    """
+    Whether a failed structured output call was the provider refusing the schema or tool calling itself,
+    as opposed to a timeout, exhausted retries or an auth or quota error that a text request would hit as well
+    """
+    if isinstance(error, NotImplementedError):
+        return True
+    if not isinstance(error, Exception) or error_status_code(error) not in (400, 422):
+        return False
+    message = str(error).lower()
+    return any(hint in message for hint in STRUCTURED_REJECTION_HINTS)
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    return error_status_code(error) == 429 or "RateLimit" in type(error).__name__ or "rate limit" in str(error).lower()
+
+
+def is_retryable_error(error: Exception) -> bool:
+    if isinstance(error, (TimeoutError, asyncio.TimeoutError, ConnectionError)) or is_rate_limit_error(error):
+        return True
+    if error_status_code(error) in RETRYABLE_STATUS_CODES:
+        return True
+    return any(name in type(error).__name__ for name in RETRYABLE_ERROR_NAMES)
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """
+    Reads a retry-after hint from the error or the headers of its HTTP response
+    """
+    value = getattr(error, "retry_after", None)
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    if value is None and hasattr(headers, "get"):
+        milliseconds = headers.get("retry-after-ms")
+        if milliseconds is not None:
+            try:
+                return float(milliseconds) / 1000.0
+            except (TypeError, ValueError):
+                pass
+        value = headers.get("retry-after")
+    try:
+        return max(0.0, float(value)) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def run_sync(coroutine: Awaitable[Any]) -> Any:
+    """
+    Runs a coroutine to completion from synchronous code, on a new event loop, or on a worker thread when the
+    calling thread is already running one
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coroutine).result()
+
+
+def stage_for_context(context: str) -> str:
+    """
+    Maps a call context such as "product generation shard 3/20" to its stage name
+    """
+    for prefix, stage in (("categor", "categories"), ("product", "products"), ("user", "users")):
+        if context.startswith(prefix):
+            return stage
+    return "other"
+
+
+def response_token_usage(response: Any) -> tuple[Optional[int], Optional[int]]:
+    """
+    Provider-reported (prompt_tokens, completion_tokens) of a chat response, None where not reported
+    """
+    usage = getattr(response, "usage_metadata", None)
+    if isinstance(usage, dict) and usage:
+        return usage.get("input_tokens"), usage.get("output_tokens")
+    usage = (getattr(response, "response_metadata", None) or {}).get("token_usage")
+    if isinstance(usage, dict) and usage:
+        return usage.get("prompt_tokens"), usage.get("completion_tokens")
+    return None, None
+
+
+def response_cached_tokens(response: Any) -> Optional[int]:
+    """
+    Provider-reported prompt tokens served from the provider's prompt cache, None where not reported
+    """
+    usage = getattr(response, "usage_metadata", None)
+    if isinstance(usage, dict) and isinstance(usage.get("input_token_details"), dict):
+        return usage["input_token_details"].get("cache_read")
+    usage = (getattr(response, "response_metadata", None) or {}).get("token_usage")
+    if isinstance(usage, dict) and isinstance(usage.get("prompt_tokens_details"), dict):
+        return usage["prompt_tokens_details"].get("cached_tokens")
+    return None
+
+
+class GenerationMetrics:
+    """
+    Thread-safe per-stage counters for LLM calls and validation: tokens, latency and time to first token,
+    records parsed and accepted, and rejections by reason. Latency quantiles come from the most recent
+    samples. Events are mirrored to OpenTelemetry instruments once enable_opentelemetry() succeeds.
+    """
+    SAMPLE_SIZE = 1024
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stages: Dict[str, Dict[str, Any]] = {}
+        self._otel: Optional[Dict[str, Any]] = None
+    def _stage(self, stage: str) -> Dict[str, Any]:
+        if stage not in self.stages:
+            self.stages[stage] = {
+                "calls": 0, "errors": 0, "retries": 0, "cache_hits": 0,
+                "prompt_tokens": 0, "cached_prompt_tokens": 0, "completion_tokens": 0, "prompt_prefixes": {},
+                "latency_sum": 0.0, "latency": deque(maxlen=self.SAMPLE_SIZE),
+                "ttft_sum": 0.0, "ttft_count": 0, "ttft": deque(maxlen=self.SAMPLE_SIZE),
+                "records_parsed": 0, "records_valid": 0, "rejected": {},
+            }
+        return self.stages[stage]
+    def enable_opentelemetry(self) -> bool:
+        try:
+            from opentelemetry import metrics
+        except ImportError:
+            return False
+        meter = metrics.get_meter("ecomm-data-generator")
+        self._otel = {
+            "calls": meter.create_counter("ecomm_generator.llm.calls", description="LLM calls"),
+            "errors": meter.create_counter("ecomm_generator.llm.errors", description="Failed LLM calls"),
+            "tokens": meter.create_counter("ecomm_generator.llm.tokens", unit="{token}", description="Prompt and completion tokens"),
+            "latency": meter.create_histogram("ecomm_generator.llm.latency", unit="s", description="LLM call latency"),
+            "ttft": meter.create_histogram("ecomm_generator.llm.time_to_first_token", unit="s", description="Time to first streamed token"),
+            "parsed": meter.create_counter("ecomm_generator.records.parsed", description="Records parsed from LLM output"),
+            "rejected": meter.create_counter("ecomm_generator.records.rejected", description="Records or fields rejected by validation"),
+        }
+        return True
+    def record_call(self, stage: str, latency: float, prompt_tokens: int = 0, completion_tokens: int = 0, ttft: Optional[float] = None, error: bool = False, cached_tokens: int = 0) -> None:
+        with self._lock:
+            metrics = self._stage(stage)
+            metrics["calls"] += 1
+            metrics["errors"] += int(error)
+            metrics["prompt_tokens"] += prompt_tokens
+            metrics["cached_prompt_tokens"] += cached_tokens
+            metrics["completion_tokens"] += completion_tokens
+            metrics["latency_sum"] += latency
+            metrics["latency"].append(latency)
+            if ttft is not None:
+                metrics["ttft_sum"] += ttft
+                metrics["ttft_count"] += 1
+                metrics["ttft"].append(ttft)
+        if self._otel is not None:
+            attributes = {"stage": stage}
+            self._otel["calls"].add(1, attributes)
+            if error:
+                self._otel["errors"].add(1, attributes)
+            self._otel["tokens"].add(prompt_tokens, {**attributes, "kind": "prompt"})
+            self._otel["tokens"].add(completion_tokens, {**attributes, "kind": "completion"})
+            self._otel["latency"].record(latency, attributes)
+            if ttft is not None:
+                self._otel["ttft"].record(ttft, attributes)
+    def record_retry(self, stage: str) -> None:
+        with self._lock:
+            self._stage(stage)["retries"] += 1
+    def record_prompt_prefix(self, stage: str, prefix_hash: str) -> None:
+        with self._lock:
+            prefixes = self._stage(stage)["prompt_prefixes"]
+            prefixes[prefix_hash] = prefixes.get(prefix_hash, 0) + 1
+    def record_cache_hit(self, stage: str) -> None:
+        with self._lock:
+            self._stage(stage)["cache_hits"] += 1
+    def record_records(self, stage: str, parsed: int, valid: int) -> None:
+        with self._lock:
+            metrics = self._stage(stage)
+            metrics["records_parsed"] += parsed
+            metrics["records_valid"] += valid
+        if self._otel is not None:
+            self._otel["parsed"].add(parsed, {"stage": stage})
+    def record_reject(self, stage: str, reason: str, count: int = 1) -> None:
+        if count <= 0:
+            return
+        with self._lock:
+            rejected = self._stage(stage)["rejected"]
+            rejected[reason] = rejected.get(reason, 0) + count
+        if self._otel is not None:
+            self._otel["rejected"].add(count, {"stage": stage, "reason": reason})
+    @staticmethod
+    def _quantile(samples: List[float], q: float) -> Optional[float]:
+        if not samples:
+            return None
+        ordered = sorted(samples)
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 6)
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Returns: {stage: metrics} with latency and time-to-first-token summaries in seconds
+        """
+        with self._lock:
+            report = {}
+            for stage, metrics in self.stages.items():
+                latency, ttft = list(metrics["latency"]), list(metrics["ttft"])
+                report[stage] = {
+                    **{key: metrics[key] for key in ("calls", "errors", "retries", "cache_hits", "prompt_tokens", "cached_prompt_tokens", "completion_tokens", "records_parsed", "records_valid")},
+                    "rejected": dict(metrics["rejected"]),
+                    "prompt_prefixes": dict(metrics["prompt_prefixes"]),
+                    "latency_seconds": {
+                        "sum": round(metrics["latency_sum"], 4),
+                        "mean": round(metrics["latency_sum"] / metrics["calls"], 4) if metrics["calls"] else None,
+                        "p50": self._quantile(latency, 0.5),
+                        "p95": self._quantile(latency, 0.95),
+                    },
+                    "ttft_seconds": {
+                        "mean": round(metrics["ttft_sum"] / metrics["ttft_count"], 4) if metrics["ttft_count"] else None,
+                        "p50": self._quantile(ttft, 0.5),
+                        "p95": self._quantile(ttft, 0.95),
+                    },
+                }
+            return report
+    def to_prometheus(self, prefix: str = "ecomm_generator") -> str:
+        """
+        Renders the snapshot in the Prometheus text exposition format
+        """
+        snapshot = self.snapshot()
+        lines: List[str] = []
+        def family(name: str, kind: str, help_text: str, samples: List[tuple]) -> None:
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} {kind}")
+            for suffix, labels, value in samples:
+                if value is None:
+                    continue
+                rendered = ",".join(f'{key}="{str(label).replace(chr(34), chr(39))}"' for key, label in labels.items())
+                lines.append(f"{prefix}_{name}{suffix}{{{rendered}}} {value}")
+        for name, key, help_text in (
+            ("llm_calls_total", "calls", "LLM calls"),
+            ("llm_errors_total", "errors", "Failed LLM calls"),
+            ("llm_retries_total", "retries", "Retried LLM calls"),
+            ("llm_cache_hits_total", "cache_hits", "LLM responses served from the response cache"),
+            ("llm_cached_prompt_tokens_total", "cached_prompt_tokens", "Prompt tokens the provider served from its prompt cache"),
+            ("records_parsed_total", "records_parsed", "Records parsed from LLM output"),
+            ("records_valid_total", "records_valid", "Records accepted by validation"),
+        ):
+            family(name, "counter", help_text, [("", {"stage": stage}, metrics[key]) for stage, metrics in snapshot.items()])
+        family("llm_tokens_total", "counter", "Prompt and completion tokens", [
+            ("", {"stage": stage, "kind": kind}, metrics[f"{kind}_tokens"])
+            for stage, metrics in snapshot.items() for kind in ("prompt", "completion")
+        ])
+        family("records_rejected_total", "counter", "Records or fields rejected by validation", [
+            ("", {"stage": stage, "reason": reason}, count)
+            for stage, metrics in snapshot.items() for reason, count in metrics["rejected"].items()
+        ])
+        for name, key, help_text in (("llm_latency_seconds", "latency_seconds", "LLM call latency"), ("llm_ttft_seconds", "ttft_seconds", "Time to first streamed token")):
+            samples: List[tuple] = []
+            for stage, metrics in snapshot.items():
+                summary = metrics[key]
+                samples.extend(("", {"stage": stage, "quantile": q}, summary[f"p{int(q * 100)}"]) for q in (0.5, 0.95))
+                if key == "latency_seconds":
+                    samples.append(("_sum", {"stage": stage}, summary["sum"]))
+                    samples.append(("_count", {"stage": stage}, metrics["calls"]))
+            family(name, "summary", help_text, samples)
+        return "\n".join(lines) + "\n"
+
+
+def product_name_key(record: Dict) -> str:
+    """
+    Case and whitespace insensitive product name used to drop the same product generated by two chunks
+    """
+    return " ".join(str(record.get("name") or "").lower().split())
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Counts prompt tokens with tiktoken when it is installed, otherwise estimates ~4 characters per token
+    """
+    try:
+        import tiktoken
+    except ImportError:
+        return (len(text) + 3) // 4
+    return len(tiktoken.get_encoding("cl100k_base").encode(text))
+
+
+def encode_table(rows: List[Dict]) -> str:
+    """
+    Renders a list of flat dicts as a '|' separated table with a single header row
+    """
+    if not rows:
+        return ""
+    columns = list(rows[0].keys())
+    lines = ["|".join(columns)]
+    for row in rows:
+        lines.append("|".join(str(row.get(column, "")).replace("|", "/").replace("\n", " ") for column in columns))
+    return "\n".join(lines)
+
+
+DATASET_COLUMNS: Dict[str, List[tuple]] = {
+    "categories": [
+        ("id", ("id",), "string"),
+        ("text", ("text",), "string"),
+        ("name", ("name",), "string"),
+        ("description", ("description",), "string"),
+        ("parent_id", ("parent_id",), "string"),
+        ("alias", ("alias",), "string"),
+    ],
+    "products": [
+        ("id", ("id",), "string"),
+        ("text", ("text",), "string"),
+        ("name", ("name",), "string"),
+        ("description", ("description",), "string"),
+        ("category_id", ("category_id",), "string"),
+        ("subcategory_id", ("subcategory_id",), "string"),
+        ("price", ("price",), "float64"),
+        ("specifications_weight", ("specifications", "weight"), "string"),
+        ("specifications_dimensions", ("specifications", "dimensions"), "string"),
+        ("specifications_color", ("specifications", "color"), "string"),
+        ("specifications_material", ("specifications", "material"), "string"),
+        ("specifications_warranty", ("specifications", "warranty"), "string"),
+        ("inventory_stock_count", ("inventory", "stock_count"), "int64"),
+        ("inventory_sku", ("inventory", "sku"), "string"),
+        ("inventory_warehouse_location", ("inventory", "warehouse_location"), "string"),
+        ("ratings_average_score", ("ratings", "average_score"), "float64"),
+        ("ratings_review_count", ("ratings", "review_count"), "int64"),
+        ("shipping_info_free_shipping", ("shipping_info", "free_shipping"), "bool"),
+        ("shipping_info_shipping_weight", ("shipping_info", "shipping_weight"), "string"),
+        ("shipping_info_handling_time", ("shipping_info", "handling_time"), "string"),
+        ("alias", ("alias",), "string"),
+    ],
+    "users": [
+        ("id", ("id",), "string"),
+        ("text", ("text",), "string"),
+        ("name", ("name",), "string"),
+        ("email", ("email",), "string"),
+        ("join_date", ("join_date",), "string"),
+        ("purchase_history", ("purchase_history",), "purchases"),
+        ("favorite_categories", ("favorite_categories",), "favorites"),
+        ("total_spent", ("total_spent",), "float64"),
+        ("account_status", ("account_status",), "string"),
+        ("last_login", ("last_login",), "string"),
+        ("alias", ("alias",), "string"),
+    ],
+}
+NESTED_COLUMN_FIELDS: Dict[str, List[tuple]] = {
+    "purchases": [("product_id", "string"), ("purchase_date", "string"), ("price", "float64")],
+    "favorites": [("category_id", "string"), ("name", "string")],
+}
+
+
+def arrow_type(pa: Any, kind: str) -> Any:
+    if kind in NESTED_COLUMN_FIELDS:
+        return pa.list_(pa.struct([(name, arrow_type(pa, field_kind)) for name, field_kind in NESTED_COLUMN_FIELDS[kind]]))
+    return {"string": pa.string(), "float64": pa.float64(), "int64": pa.int64(), "bool": pa.bool_()}[kind]
+
+
+def coerce_column_value(value: Any, kind: str) -> Any:
+    """
+    Converts a loosely typed LLM value to the column type, None when it cannot be converted
+    """
+    if value is None:
+        return None
+    try:
+        if kind == "string":
+            return value if isinstance(value, str) else json.dumps(value, default=str)
+        if kind == "float64":
+            return float(value)
+        if kind == "int64":
+            return int(float(value))
+        if kind == "bool":
+            if isinstance(value, str):
+                return {"true": True, "yes": True, "false": False, "no": False}.get(value.strip().lower())
+            return bool(value)
+        if kind in NESTED_COLUMN_FIELDS:
+            if not isinstance(value, list):
+                return None
+            return [
+                {name: coerce_column_value(item.get(name), field_kind) for name, field_kind in NESTED_COLUMN_FIELDS[kind]}
+                for item in value if isinstance(item, dict)
+            ]
+    except (ValueError, TypeError, OverflowError):
+        return None
+    return None
+
+
+def column_value(record: Dict, path: tuple) -> Any:
+    value: Any = record
+    for key in path:
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    return value
+
+
+class ColumnarDatasetWriter:
+    """
+    Writes dataset records to a typed Arrow table with nested fields flattened into columns.
+    Records are converted and written in row groups of at most row_group_size rows so memory stays bounded.
+    "parquet" writes through ParquetWriter; "arrow" writes an uncompressed Arrow IPC file that can be
+    memory-mapped and read back zero-copy. Requires pyarrow.
+    """
+    def __init__(self, path: str, table: str, file_format: str = "parquet", row_group_size: int = 10000):
+        import pyarrow as pa
+        self.pa = pa
+        self.columns = DATASET_COLUMNS[table]
+        self.schema = pa.schema([(name, arrow_type(pa, kind)) for name, _, kind in self.columns])
+        self.file_format = file_format
+        self.row_group_size = max(1, row_group_size)
+        self.rows = 0
+        self.row_groups = 0
+        self._pending: List[Dict] = []
+        self._sink = None
+        if file_format == "parquet":
+            import pyarrow.parquet as pq
+            self._writer = pq.ParquetWriter(path, self.schema)
+        else:
+            import pyarrow.ipc as ipc
+            self._sink = pa.OSFile(path, "wb")
+            self._writer = ipc.new_file(self._sink, self.schema)
+    def write(self, record: Dict) -> None:
+        self._pending.append(record)
+        if len(self._pending) >= self.row_group_size:
+            self.flush()
+    def write_all(self, records: Iterable[Dict]) -> None:
+        for record in records:
+            self.write(record)
+    def flush(self) -> None:
+        if not self._pending:
+            return
+        arrays = [
+            self.pa.array([coerce_column_value(column_value(record, path), kind) for record in self._pending], type=field.type)
+            for (_, path, kind), field in zip(self.columns, self.schema)
+        ]
+        batch = self.pa.RecordBatch.from_arrays(arrays, schema=self.schema)
+        if self.file_format == "parquet":
+            self._writer.write_table(self.pa.Table.from_batches([batch]))
+        else:
+            self._writer.write_batch(batch)
+        self.rows += len(self._pending)
+        self.row_groups += 1
+        self._pending = []
+    def close(self) -> None:
+        try:
+            self.flush()
+        finally:
+            self._writer.close()
+            if self._sink is not None:
+                self._sink.close()
+    def __enter__(self) -> "ColumnarDatasetWriter":
+        return self
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class NDJSONSink:
+    """
+    Writes records as newline-delimited JSON to a file.
+    Every line is flushed as it is written so a reader tailing the sink sees each record immediately.
+    """
+    def __init__(self, path: str):
+        self.path = os.path.expanduser(path)
+        self.records = 0
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._stream = open(self.path, "w", encoding="utf-8")
+    def write(self, record: Dict) -> None:
+        self._stream.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+        self._stream.flush()
+        self.records += 1
+    def close(self) -> None:
+        self._stream.close()
+
+
+class ProductStream:
+    """
+    One product generation run on a background thread as soon as it is created, whether or not anyone reads it.
+    Products are written to an NDJSON file, the given path or a temporary file removed with the stream, and
+    readers tail that file, so any number of them can iterate the lines from the start while generation
+    continues without the lines being held in memory. The Products output can wait for the same run instead
+    of generating again.
+    """
+    def __init__(self, products: AsyncIterator[Data], path: str = ""):
+        if not path:
+            handle, path = tempfile.mkstemp(prefix="products-", suffix=".ndjson")
+            os.close(handle)
+            weakref.finalize(self, os.remove, path)
+        self.sink = NDJSONSink(path)
+        self.written = 0
+        self.finished = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=asyncio.run, args=(self._drain(products),), daemon=True)
+        self._thread.start()
+    async def _drain(self, products: AsyncIterator[Data]) -> None:
+        try:
+            async for product in products:
+                self.sink.write(product.data)
+                with self._cond:
+                    self.written += 1
+                    self._cond.notify_all()
+        finally:
+            self.sink.close()
+            with self._cond:
+                self.finished = True
+                self._cond.notify_all()
+    def iter_lines(self) -> Iterator[str]:
+        read = 0
+        with open(self.sink.path, encoding="utf-8") as stream:
+            while True:
+                with self._cond:
+                    while read >= self.written and not self.finished:
+                        self._cond.wait()
+                    available = self.written - read
+                if not available:
+                    return
+                # Only lines counted in written are complete, a partly flushed line is never read
+                for _ in range(available):
+                    yield stream.readline()
+                read += available
+    def wait(self) -> None:
+        self._thread.join()
+
+
+# Guards the check-and-start of a component's product generation against its two product outputs
+_PRODUCT_GENERATION_LOCK = threading.Lock()
+
+
+def approximate_record_bytes(records: List[Data], samples: int = 256) -> int:
+    """
+    Estimates the in-memory size of records from the deep size of an evenly spaced sample.
+    Dict keys are skipped because decoded JSON shares them between records
+    """
+    if not records:
+        return 0
+    step = max(1, len(records) // samples)
+    sampled = records[::step]
+    total = 0
+    for record in sampled:
+        stack: List[Any] = [record.data]
+        while stack:
+            value = stack.pop()
+            total += sys.getsizeof(value)
+            if isinstance(value, dict):
+                stack.extend(value.values())
+            elif isinstance(value, (list, tuple, set)):
+                stack.extend(value)
+    return total * len(records) // len(sampled)
+
+
+class DatasetRun:
+    """
+    Categories, products and users generated by one component run, with the id indexes and reports derived
+    from them, so every component working on the run sees state that matches its records
+    """
+    TABLES = ("categories", "products", "users")
+    DERIVED = {
+        "categories": {"category_index": dict, "context_aliases": lambda: None},
+        "products": {"product_index": dict, "context_aliases": lambda: None},
+        "users": {"user_index": dict, "coverage_report": dict, "sampled_product_ids": set},
+    }
+    def __init__(self, run_id: str, anonymous: bool = False):
+        self.run_id = run_id
+        self.anonymous = anonymous
+        self.holders = 0
+        self.categories: List[Data] = []
+        self.products: List[Data] = []
+        self.users: List[Data] = []
+        self.category_index: Dict[str, Data] = {}
+        self.product_index: Dict[str, Data] = {}
+        self.user_index: Dict[str, Data] = {}
+        self.context_aliases: "Optional[ContextAliases]" = None
+        self.context_token_report: Dict[str, Dict] = {}
+        self.coverage_report: Dict[str, Any] = {}
+        self.sampled_product_ids: set = set()
+        self._size_key: Optional[tuple] = None
+        self._size = 0
+    def tables(self) -> Dict[str, List[Data]]:
+        return {table: getattr(self, table) for table in self.TABLES}
+    def clear(self, table: str) -> None:
+        """
+        Drops a table's records together with the indexes and reports derived from them
+        """
+        setattr(self, table, [])
+        for name, factory in self.DERIVED[table].items():
+            setattr(self, name, factory())
+    def approximate_bytes(self) -> int:
+        key = tuple(len(records) for records in self.tables().values())
+        if key != self._size_key:
+            self._size = sum(approximate_record_bytes(records) for records in self.tables().values())
+            self._size_key = key
+        return self._size
+
+
+class DatasetStore:
+    """
+    Dataset runs of all component instances sharing a spill directory.
+    The keep_runs most recently opened runs stay in memory. Older runs that no component holds any more are
+    evicted: named runs are written to NDJSON files under spill_dir and loaded back when a run with the same id
+    is opened again, anonymous runs are dropped since nothing can reopen them. Only the max_spilled_runs most
+    recently spilled runs are kept on disk.
+    """
+    def __init__(self, spill_dir: str, keep_runs: int, max_spilled_runs: int = 32):
+        self.spill_dir = os.path.expanduser(spill_dir)
+        self.keep_runs = max(1, keep_runs)
+        self.max_spilled_runs = max(1, max_spilled_runs)
+        self.runs: "OrderedDict[str, DatasetRun]" = OrderedDict()
+        self._released: deque = deque()
+        self._lock = threading.Lock()
+    def run_dir(self, run_id: str) -> str:
+        return os.path.join(self.spill_dir, re.sub(r"[^A-Za-z0-9_.-]", "_", run_id))
+    def open_run(self, run_id: Optional[str] = None) -> DatasetRun:
+        """
+        Returns the run with this id, reloading it if it was spilled, or starts a new one.
+        The caller holds the run until it passes it to close_run, and a held run is never evicted
+        """
+        anonymous = not run_id
+        run_id = run_id or uuid.uuid4().hex
+        with self._lock:
+            run = self.runs.pop(run_id, None)
+            if run is None:
+                run = self.load_run(run_id) or DatasetRun(run_id, anonymous)
+            run.holders += 1
+            self.runs[run_id] = run
+            self.evict_runs()
+            return run
+    def close_run(self, run: DatasetRun) -> None:
+        """
+        Releases a run returned by open_run so it can be evicted once it is no longer among the keep_runs most recent
+        """
+        with self._lock:
+            run.holders = max(0, run.holders - 1)
+            self.evict_runs()
+    def release_run(self, run: DatasetRun) -> None:
+        """
+        close_run for garbage collection finalizers, which may run while this thread holds the lock;
+        the release is applied on the next open_run or close_run
+        """
+        self._released.append(run)
+    def evict_runs(self) -> None:
+        # Called with the lock held; runs still held stay in memory even beyond keep_runs
+        while self._released:
+            run = self._released.popleft()
+            run.holders = max(0, run.holders - 1)
+        for run_id in list(self.runs):
+            if len(self.runs) <= self.keep_runs:
+                break
+            run = self.runs[run_id]
+            if run.holders:
+                continue
+            del self.runs[run_id]
+            if not run.anonymous:
+                self.spill_run(run)
+    def spill_run(self, run: DatasetRun) -> None:
+        directory = self.run_dir(run.run_id)
+        os.makedirs(directory, exist_ok=True)
+        for table, records in run.tables().items():
+            sink = NDJSONSink(os.path.join(directory, f"{table}.ndjson"))
+            try:
+                for record in records:
+                    sink.write(record.data)
+            finally:
+                sink.close()
+        self.prune_spilled_runs()
+    def prune_spilled_runs(self) -> None:
+        """
+        Deletes the least recently spilled runs beyond max_spilled_runs, never one that is in memory
+        """
+        in_memory = {os.path.basename(self.run_dir(run_id)) for run_id in self.runs}
+        spilled = [
+            entry for entry in os.scandir(self.spill_dir)
+            if entry.is_dir() and entry.name not in in_memory
+            and any(os.path.exists(os.path.join(entry.path, f"{table}.ndjson")) for table in DatasetRun.TABLES)
+        ]
+        spilled.sort(key=lambda entry: entry.stat().st_mtime, reverse=True)
+        for entry in spilled[self.max_spilled_runs:]:
+            shutil.rmtree(entry.path, ignore_errors=True)
+    def load_run(self, run_id: str) -> Optional[DatasetRun]:
+        directory = self.run_dir(run_id)
+        if not os.path.isdir(directory):
+            return None
+        run = DatasetRun(run_id)
+        for table, records in run.tables().items():
+            path = os.path.join(directory, f"{table}.ndjson")
+            if os.path.exists(path):
+                with open(path, encoding="utf-8") as f:
+                    records.extend(Data(data=json.loads(line)) for line in f if line.strip())
+        return run
+    def memory_report(self) -> Dict[str, Any]:
+        with self._lock:
+            per_run = {run_id: run.approximate_bytes() for run_id, run in self.runs.items()}
+        spilled = set(os.listdir(self.spill_dir)) if os.path.isdir(self.spill_dir) else set()
+        return {
+            "runs_in_memory": len(per_run),
+            "keep_runs": self.keep_runs,
+            "max_spilled_runs": self.max_spilled_runs,
+            "spilled_runs": len(spilled - {os.path.basename(self.run_dir(run_id)) for run_id in per_run}),
+            "approx_bytes": sum(per_run.values()),
+            "per_run_bytes": per_run,
+        }
+
+
+_DATASET_STORES: Dict[str, DatasetStore] = {}
+_DATASET_STORES_LOCK = threading.Lock()
+
+
+def run_attribute(name: str) -> property:
+    """
+    Component property reading and writing an attribute of the instance's DatasetRun
+    """
+    return property(lambda self: getattr(self.dataset_run, name), lambda self, value: setattr(self.dataset_run, name, value))
+
+
+def get_dataset_store(spill_dir: str, keep_runs: int, max_spilled_runs: int = 32) -> DatasetStore:
+    """
+    Returns the process-wide dataset store for a spill directory, applying the latest retention settings
+    """
+    key = os.path.abspath(os.path.expanduser(spill_dir))
+    with _DATASET_STORES_LOCK:
+        if key not in _DATASET_STORES:
+            _DATASET_STORES[key] = DatasetStore(spill_dir, keep_runs, max_spilled_runs)
+        store = _DATASET_STORES[key]
+        store.keep_runs = max(1, keep_runs)
+        store.max_spilled_runs = max(1, max_spilled_runs)
+        return store
+
+
+class RunCheckpoint:
+    """
+    Completed generation chunks of one run, stored as JSON files next to a manifest.json that lists them.
+    Chunk files and the manifest are written to a temporary file and renamed, so an interrupted run never
+    records a chunk that was not fully stored. A manifest written with different generation parameters is discarded.
+    """
+    def __init__(self, directory: str, run_id: str, params: Dict):
+        self.directory = os.path.join(os.path.expanduser(directory), re.sub(r"[^A-Za-z0-9_.-]", "_", run_id))
+        self.manifest_path = os.path.join(self.directory, "manifest.json")
+        self._lock = threading.Lock()
+        os.makedirs(os.path.join(self.directory, "chunks"), exist_ok=True)
+        self.manifest: Dict[str, Any] = {"run_id": run_id, "params": params, "chunks": {}}
+        self.discarded = False
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, encoding="utf-8") as f:
+                stored = json.load(f)
+            if stored.get("params") == params:
+                self.manifest = stored
+            else:
+                self.discarded = True
+    def _write_json(self, path: str, value: Any) -> None:
+        partial_path = f"{path}.partial"
+        with open(partial_path, "w", encoding="utf-8") as f:
+            json.dump(value, f, ensure_ascii=False, default=str)
+        os.replace(partial_path, path)
+    def load(self, key: str) -> Optional[List[Dict]]:
+        entry = self.manifest["chunks"].get(key)
+        if entry is None:
+            return None
+        with open(os.path.join(self.directory, entry["file"]), encoding="utf-8") as f:
+            return json.load(f)
+    def save(self, key: str, records: List[Dict]) -> None:
+        file_name = os.path.join("chunks", re.sub(r"[^A-Za-z0-9_.-]", "_", key) + ".json")
+        self._write_json(os.path.join(self.directory, file_name), records)
+        with self._lock:
+            self.manifest["chunks"][key] = {"file": file_name, "records": len(records), "saved_at": time.time()}
+            self._write_json(self.manifest_path, self.manifest)
+
+
+class ContextAliases:
+    """
+    Short aliases for dataset ids used in compact prompt context: C1 for a category, C1.2 for its
+    second subcategory and P17 for a product. Aliases in LLM output are resolved back to the real ids.
+    """
+    REFERENCE_FIELDS = ("id", "category_id", "subcategory_id", "parent_id", "product_id")
+    def next_free(self, prefix: str, number: int) -> tuple[str, int]:
+        while f"{prefix}{number}" in self.alias_to_id:
+            number += 1
+        return f"{prefix}{number}", number
+    def __init__(self):
+        self.alias_to_id: Dict[str, str] = {}
+        self.id_to_alias: Dict[str, str] = {}
+    def assign(self, record_id: str, alias: str) -> None:
+        self.alias_to_id[alias] = record_id
+        self.id_to_alias[record_id] = alias
+    @classmethod
+    def for_dataset(cls, categories: List[Data], products: List[Data]) -> "ContextAliases":
+        """
+        Keeps the aliases records were generated with and numbers every other record in order
+        """
+        aliases = cls()
+        for record in [*categories, *products]:
+            record_id, alias = record.data.get("id"), record.data.get("alias")
+            if record_id and alias and alias not in aliases.alias_to_id:
+                aliases.assign(record_id, alias)
+        subcategory_counts: Dict[str, int] = {}
+        category_number = orphan_number = product_number = 0
+        for cat in categories:
+            cat_id = cat.data.get("id")
+            if cat_id and "parent_id" not in cat.data and cat_id not in aliases.id_to_alias:
+                alias, category_number = aliases.next_free("C", category_number + 1)
+                aliases.assign(cat_id, alias)
+        for cat in categories:
+            cat_id = cat.data.get("id")
+            if not cat_id or cat_id in aliases.id_to_alias:
+                continue
+            parent_alias = aliases.id_to_alias.get(cat.data.get("parent_id"))
+            if parent_alias:
+                alias, subcategory_counts[parent_alias] = aliases.next_free(f"{parent_alias}.", subcategory_counts.get(parent_alias, 0) + 1)
+            else:
+                alias, orphan_number = aliases.next_free("S", orphan_number + 1)
+            aliases.assign(cat_id, alias)
+        for prod in products:
+            prod_id = prod.data.get("id")
+            if prod_id and prod_id not in aliases.id_to_alias:
+                alias, product_number = aliases.next_free("P", product_number + 1)
+                aliases.assign(prod_id, alias)
+        return aliases
+    def alias_row(self, row: Dict) -> Dict:
+        return {
+            key: self.id_to_alias.get(value, value) if key in self.REFERENCE_FIELDS and isinstance(value, str) else value
+            for key, value in row.items()
+        }
+    def resolve(self, value: Any) -> Any:
+        # Aliases are stored upper-cased, the model may echo them as c1.2 or p17
+        if isinstance(value, str):
+            return self.alias_to_id.get(value.strip().upper(), value)
+        return value
+
+
+class CustomComponent(Component):
+    display_name = "eComm Data Generator"
+    description = "Use as a template to create your own component."
+    documentation: str = "http://docs.langflow.org/components/custom"
+    icon = "code"
+    name = "ecomm-data-generator"
+    inputs = [
+        StrInput(name="store_theme", display_name="Theme", value="Consumer Electronics"),
+        IntInput(name="num_categories", display_name="Categories", value=10),
+        IntInput(name="num_products", display_name="Products", value=100),
+        IntInput(name="num_users", display_name="Users", value=10),
+        HandleInput(name="llm", display_name="Language Model", input_types=["LanguageModel"], info="Connect to a Language Model component"),
+        StrInput(name="prompt_dir", display_name="Prompt Directory", value="", advanced=True, info="Optional directory overriding the built-in templates with categoryprompt.md, productprompt.md or userprompt.md files, e.g. llm_prompts; missing files keep the built-in text"),
+        BoolInput(name="system_prompt_prefix", display_name="System Prompt Prefix", value=True, advanced=True, info="Send the static rules and schema of each prompt as a system message ahead of the catalog context and per-call request, so repeated calls share a cacheable prefix"),
+        BoolInput(name="prompt_cache_key", display_name="Send Prompt Cache Key", value=False, advanced=True, info="Pass the prompt prefix hash as prompt_cache_key so providers that support it (OpenAI) route calls sharing a prefix to the same cache"),
+        BoolInput(name="compact_context", display_name="Compact Prompt Context", value=False, advanced=True, info="Render category/product context as '|' separated tables with short aliases (C1, C1.2, P17) instead of indented JSON"),
+        BoolInput(name="alias_ids", display_name="Short Alias IDs", value=False, advanced=True, info="Have the model emit short ids (C1, C1.2, P17, U3) and derive real UUIDs from them with uuid5"),
+        StrInput(name="id_namespace", display_name="ID Namespace", value="", advanced=True, info="Namespace for UUIDs derived from short alias ids, defaults to the theme"),
+        IntInput(name="users_context_size", display_name="Products per Users Prompt", value=10, advanced=True, info="Number of products shown in each users prompt, sampled across categories and price bands"),
+        BoolInput(name="batched_users", display_name="Batched Users", value=False, advanced=True, info="Generate users in batches on a worker pool and merge them in batch order"),
+        IntInput(name="users_per_batch", display_name="Users per Batch", value=25, advanced=True, info="Maximum number of users requested in a single LLM call when batching"),
+        IntInput(name="user_workers", display_name="User Workers", value=4, advanced=True, info="Maximum number of user batches generated at the same time"),
+        BoolInput(name="hybrid_synthesis", display_name="Synthesize Numeric Fields", value=False, advanced=True, info="Let the LLM write only names, descriptions and references; prices, inventory, ratings, shipping and purchase dates are drawn from seeded distributions"),
+        IntInput(name="seed", display_name="Seed", value=42, advanced=True, info="Seed for synthesized numeric fields"),
+        StrInput(name="price_range", display_name="Price Range", value="5-500", advanced=True, info="Default min-max price for synthesized prices"),
+        DictInput(name="category_price_ranges", display_name="Category Price Ranges", advanced=True, info="Min-max price per category or subcategory name, id or alias, e.g. Laptops: 400-2500"),
+        BoolInput(name="sharded_products", display_name="Sharded Products", value=False, advanced=True, info="Split product generation into smaller chunks that are generated concurrently and merged"),
+        DropdownInput(name="shard_strategy", display_name="Shard Strategy", options=["subcategory", "fixed"], value="subcategory", advanced=True, info="Shard per subcategory, or into fixed-size chunks over all categories"),
+        IntInput(name="products_per_shard", display_name="Products per Shard", value=50, advanced=True, info="Maximum number of products requested in a single LLM call when sharding"),
+        IntInput(name="max_concurrency", display_name="Max Concurrency", value=4, advanced=True, info="Maximum number of LLM calls running at the same time"),
+        BoolInput(name="salvage_partial", display_name="Salvage Partial Responses", value=True, advanced=True, info="Keep every complete record from a truncated or malformed response and request only the missing remainder"),
+        IntInput(name="max_followup_requests", display_name="Max Follow-up Requests", value=2, advanced=True, info="Maximum number of follow-up prompts used to request records missing from a salvaged response"),
+        BoolInput(name="cache_llm_responses", display_name="Cache LLM Responses", value=True, advanced=True, info="Reuse stored responses for identical model, parameters and prompt instead of calling the LLM again"),
+        StrInput(name="cache_dir", display_name="Cache Directory", value="~/.cache/ecomm-data-generator", advanced=True, info="Local directory holding the response cache"),
+        IntInput(name="cache_max_mb", display_name="Cache Size (MB)", value=256, advanced=True, info="Least recently used responses are evicted once the compressed cache exceeds this size"),
+        IntInput(name="rate_limit_rpm", display_name="Requests per Minute", value=0, advanced=True, info="Provider request quota shared by all generator calls to the model in this process, 0 disables the request budget"),
+        IntInput(name="rate_limit_tpm", display_name="Tokens per Minute", value=0, advanced=True, info="Provider token quota shared by all generator calls to the model in this process, 0 disables the token budget"),
+        IntInput(name="max_retries", display_name="Max Retries", value=3, advanced=True, info="Retries of a rate-limited or transiently failing LLM call, with jittered exponential backoff"),
+        FloatInput(name="retry_base_delay", display_name="Retry Base Delay (s)", value=1.0, advanced=True, info="Backoff before the first retry, doubled for each further attempt; retry-after hints take precedence"),
+        FloatInput(name="retry_max_delay", display_name="Retry Max Delay (s)", value=60.0, advanced=True, info="Upper bound of the exponential backoff"),
+        FloatInput(name="llm_timeout", display_name="LLM Timeout (s)", value=0, advanced=True, info="Timeout for a single async LLM call or stream, 0 disables it"),
+        StrInput(name="export_dir", display_name="Export Directory", value="dataset_export", advanced=True, info="Directory the columnar export writes categories, products and users tables to"),
+        DropdownInput(name="export_format", display_name="Export Format", options=["parquet", "arrow"], value="parquet", advanced=True, info="Parquet files, or uncompressed Arrow IPC files that can be memory-mapped zero-copy"),
+        IntInput(name="export_row_group_size", display_name="Export Row Group Size", value=10000, advanced=True, info="Number of records converted and written per row group"),
+        StrInput(name="ndjson_path", display_name="NDJSON Sink", value="", advanced=True, info="File the products stream writes one JSON line per product to, empty uses a temporary file removed with the component"),
+        StrInput(name="run_id", display_name="Run ID", value="", advanced=True, info="Dataset run to work on, empty starts a new run; reusing an id continues that run's dataset"),
+        IntInput(name="keep_runs", display_name="Runs Kept in Memory", value=4, advanced=True, info="Most recent dataset runs kept in memory per process, older runs are spilled to disk"),
+        StrInput(name="spill_dir", display_name="Spill Directory", value="~/.cache/ecomm-data-generator/runs", advanced=True, info="Directory older dataset runs are spilled to as NDJSON files"),
+        IntInput(name="max_spilled_runs", display_name="Spilled Runs Kept", value=32, advanced=True, info="Most recently spilled runs kept in the spill directory, older ones are deleted"),
+        BoolInput(name="checkpoint_runs", display_name="Checkpoint Runs", value=False, advanced=True, info="Persist every completed chunk under the run id and skip completed chunks when the same run id is generated again"),
+        StrInput(name="checkpoint_dir", display_name="Checkpoint Directory", value="~/.cache/ecomm-data-generator/checkpoints", advanced=True, info="Directory holding one checkpoint folder with a manifest per run id"),
+        DropdownInput(name="metrics_export", display_name="Metrics Export", options=["none", "prometheus", "opentelemetry"], value="none", advanced=True, info="Also export generation metrics as a Prometheus text file or through the OpenTelemetry metrics API"),
+        StrInput(name="metrics_path", display_name="Metrics File", value="generation_metrics.prom", advanced=True, info="Prometheus text file rewritten after every stage when exporting to Prometheus"),
+        BoolInput(name="structured_output", display_name="Structured Output", value=True, advanced=True, info="Request records through the model's native JSON schema or tool calling mode when it supports with_structured_output, instead of parsing JSON text; not used with Stream LLM Output"),
+        BoolInput(name="stream_output", display_name="Stream LLM Output", value=False, advanced=True, info="Parse the model's token stream incrementally and validate each record as soon as it is complete"),
+    ]
+    outputs = [
+        Output(name="categories_dataset", display_name="Categories", method="acreate_categories"),
+        Output(name="products_dataset", display_name="Products", method="acreate_products"),
+        Output(name="users_dataset", display_name="Users", method="acreate_users"),
+        Output(name="products_stream", display_name="Products Stream", method="stream_products"),
+        Output(name="columnar_export", display_name="Columnar Export", method="export_dataset"),
+    ]
+    llog = logger
+    category_index = run_attribute("category_index")
+    product_index = run_attribute("product_index")
+    user_index = run_attribute("user_index")
+    context_aliases = run_attribute("context_aliases")
+    context_token_report = run_attribute("context_token_report")
+    coverage_report = run_attribute("coverage_report")
+    sampled_product_ids = run_attribute("sampled_product_ids")
+    memory_report: Optional[Dict[str, Any]] = None
+    _dataset_run: Optional[DatasetRun] = None
+    _run_finalizer: Optional[weakref.finalize] = None
+    _checkpoint: Optional[RunCheckpoint] = None
+    _generation_metrics: Optional[GenerationMetrics] = None
+    _structured_llms: Optional[Dict[tuple, Any]] = None
+    _structured_unsupported: bool = False
+    _product_stream: Optional[ProductStream] = None
+    _products_created: Optional[threading.Event] = None
+    def get_dataset_store(self) -> DatasetStore:
+        return get_dataset_store(self.spill_dir or "~/.cache/ecomm-data-generator/runs", self.keep_runs or 1, self.max_spilled_runs or 1)
+    @property
+    def dataset_run(self) -> DatasetRun:
+        """
+        This instance's dataset run, opened from the process-wide store on first use and held until close_run
+        or until the instance is garbage collected
+        """
+        if self._dataset_run is None:
+            store = self.get_dataset_store()
+            self._dataset_run = store.open_run(self.run_id or None)
+            self._run_finalizer = weakref.finalize(self, store.release_run, self._dataset_run)
+        return self._dataset_run
+    def close_run(self) -> None:
+        """
+        Releases this instance's dataset run so the store may evict it. A later access reopens the run,
+        or starts a new one when no Run ID is set
+        """
+        if self._dataset_run is not None:
+            self._run_finalizer.detach()
+            self.get_dataset_store().close_run(self._dataset_run)
+        self._dataset_run = None
+        self._run_finalizer = None
+    @property
+    def all_categories(self) -> List[Data]:
+        return self.dataset_run.categories
+    @all_categories.setter
+    def all_categories(self, records: List[Data]) -> None:
+        self.dataset_run.categories = list(records)
+    @property
+    def all_products(self) -> List[Data]:
+        return self.dataset_run.products
+    @all_products.setter
+    def all_products(self, records: List[Data]) -> None:
+        self.dataset_run.products = list(records)
+    @property
+    def all_users(self) -> List[Data]:
+        return self.dataset_run.users
+    @all_users.setter
+    def all_users(self, records: List[Data]) -> None:
+        self.dataset_run.users = list(records)
+    def checkpoint_params(self) -> Dict:
+        """
+        Generation settings a checkpoint is only valid for, since they change how chunks are planned and named
+        """
+        return {
+            "store_theme": self.store_theme,
+            "num_categories": self.num_categories,
+            "num_products": self.num_products,
+            "num_users": self.num_users,
+            "sharded_products": self.sharded_products,
+            "shard_strategy": self.shard_strategy,
+            "products_per_shard": self.products_per_shard,
+            "batched_users": self.batched_users,
+            "users_per_batch": self.users_per_batch,
+            "alias_ids": self.alias_ids,
+            "hybrid_synthesis": self.hybrid_synthesis,
+            "seed": self.seed,
+        }
+    def get_checkpoint(self) -> Optional[RunCheckpoint]:
+        if not self.checkpoint_runs:
+            return None
+        if self._checkpoint is None:
+            self._checkpoint = RunCheckpoint(self.checkpoint_dir or "~/.cache/ecomm-data-generator/checkpoints", self.dataset_run.run_id, self.checkpoint_params())
+            if self._checkpoint.discarded:
+                self.llog.warning(f"Generation settings changed, discarding checkpoint of run {self.dataset_run.run_id}")
+            self.llog.info(f"Checkpointing run {self.dataset_run.run_id} to {self._checkpoint.directory}")
+        return self._checkpoint
+    def begin_checkpointed_stage(self, table: str) -> None:
+        """
+        Clears a stage's records before a checkpointed run so completed chunks are replayed instead of appended twice
+        """
+        if self.get_checkpoint() is not None:
+            self.dataset_run.clear(table)
+    def load_checkpoint(self, key: str) -> Optional[List[Data]]:
+        checkpoint = self.get_checkpoint()
+        if checkpoint is None:
+            return None
+        records = checkpoint.load(key)
+        if records is None:
+            return None
+        self.llog.info(f"Resuming {key} from checkpoint with {len(records)} records")
+        return [Data(data=record) for record in records]
+    def save_checkpoint(self, key: str, records: List[Data]) -> None:
+        checkpoint = self.get_checkpoint()
+        if checkpoint is not None:
+            checkpoint.save(key, [record.data for record in records])
+    async def aload_checkpoint(self, key: str) -> Optional[List[Data]]:
+        return await asyncio.to_thread(self.load_checkpoint, key)
+    async def asave_checkpoint(self, key: str, records: List[Data]) -> None:
+        await asyncio.to_thread(self.save_checkpoint, key, records)
+    @property
+    def generation_metrics(self) -> GenerationMetrics:
+        if self._generation_metrics is None:
+            self._generation_metrics = GenerationMetrics()
+            if self.metrics_export == "opentelemetry" and not self._generation_metrics.enable_opentelemetry():
+                self.llog.warning("opentelemetry-api is not installed, metrics are only reported in the component status")
+        return self._generation_metrics
+    def publish_metrics(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Returns: the per-stage metrics snapshot, written to metrics_path as well when exporting to Prometheus
+        """
+        if self.metrics_export == "prometheus" and self.metrics_path:
+            path = os.path.expanduser(self.metrics_path)
+            try:
+                with open(f"{path}.partial", "w", encoding="utf-8") as f:
+                    f.write(self.generation_metrics.to_prometheus())
+                os.replace(f"{path}.partial", path)
+            except Exception as e:
+                self.llog.warning(f"Error writing metrics to {path}: {str(e)}")
+        return self.generation_metrics.snapshot()
+    def record_validation(self, stage: str, parsed: int, valid: int, rejected: Counter) -> None:
+        self.generation_metrics.record_records(stage, parsed, valid)
+        for reason, count in rejected.items():
+            self.generation_metrics.record_reject(stage, reason, count)
+    def stage_status(self) -> Dict[str, Any]:
+        status: Dict[str, Any] = {"memory": self.report_dataset_memory(), "metrics": self.publish_metrics()}
+        if self.context_token_report:
+            status["context_tokens"] = self.context_token_report
+        return status
+    def report_dataset_memory(self) -> Dict[str, Any]:
+        self.memory_report = self.get_dataset_store().memory_report()
+        self.llog.info(
+            f"Dataset store holds {self.memory_report['runs_in_memory']} runs in memory "
+            f"(~{self.memory_report['approx_bytes'] / 1e6:.1f} MB), {self.memory_report['spilled_runs']} spilled"
         )
-    def validate_llm_response(self,response_content: str, context: str = "") -> tuple[bool, str]:
+        return self.memory_report
+    def build_index(self, records: List[Data]) -> Dict[str, Data]:
         """
-        Validates LLM response content and ensures it's properly formatted JSON
-        Returns: (is_valid: bool, cleaned_content: str)
+        Builds an id -> record lookup so referential checks are O(1) per reference
+        """
+        index: Dict[str, Data] = {}
+        for record in records:
+            record_id = record.data.get("id")
+            if record_id and record_id not in index:
+                index[record_id] = record
+        return index
+    def refresh_context_aliases(self) -> None:
+        if self.compact_context or self.alias_ids:
+            self.context_aliases = ContextAliases.for_dataset(self.all_categories, self.all_products)
+    def resolve_reference(self, value: Any) -> Any:
+        """
+        Maps a short context alias from LLM output back to the real id
+        """
+        if (self.compact_context or self.alias_ids) and self.context_aliases is not None:
+            return self.context_aliases.resolve(value)
+        return value
+    def display_id(self, record_id: str) -> str:
+        """
+        Id shown to the model in prompt context: the record's alias in alias mode, otherwise the id itself
+        """
+        if self.alias_ids and self.context_aliases is not None:
+            return self.context_aliases.id_to_alias.get(record_id, record_id)
+        return record_id
+    def alias_uuid(self, alias: Any) -> Optional[str]:
+        """
+        Deterministically derives the UUID for a short alias emitted by the model
+        """
+        if not isinstance(alias, str) or not alias.strip():
+            return None
+        namespace = uuid.uuid5(uuid.NAMESPACE_URL, f"ecomm-data-generator/{self.id_namespace or self.store_theme}")
+        return str(uuid.uuid5(namespace, alias.strip().upper()))
+    def assign_record_id(self, record: Dict, data: Dict) -> Optional[str]:
+        """
+        Returns the id for a generated record; in alias mode the model's alias is kept in data["alias"]
+        and replaced by its uuid5
+        """
+        record_id = record.get("id")
+        if not self.alias_ids:
+            return record_id
+        if not isinstance(record_id, str) or not record_id.strip():
+            return None
+        data["alias"] = record_id.strip().upper()
+        return self.alias_uuid(record_id)
+    def render_context(self, rows: List[Any], label: str) -> str:
+        """
+        Renders prompt context rows as indented JSON, or as a compact aliased table when compact_context is on
+        The compact rendering is reported against the JSON rendering in context_token_report
+        """
+        verbose = json.dumps(rows, indent=2)
+        if not self.compact_context:
+            return verbose
+        if self.context_aliases is None:
+            self.refresh_context_aliases()
+        compact = encode_table([self.context_aliases.alias_row(row) for row in rows if isinstance(row, dict)])
+        report = {"verbose_tokens": estimate_tokens(verbose), "compact_tokens": estimate_tokens(compact), "rows": len(rows)}
+        self.context_token_report = {**self.context_token_report, label: report}
+        self.llog.info(f"Compact {label} context: {report['compact_tokens']} tokens instead of {report['verbose_tokens']} for {report['rows']} rows")
+        return compact
+    def get_prompt_registry(self) -> PromptRegistry:
+        return get_prompt_registry(self.prompt_dir)
+    def get_prompt_template(self, name: str) -> PromptTemplate:
+        return self.get_prompt_registry().get(name)
+    def prompt_request(self, prompt: str, context: str) -> tuple[List[Any], Dict[str, Any]]:
+        """
+        Splits a rendered prompt into a system message holding the template's static prefix and a human message
+        with the catalog context and per-call request, and records the prefix hash for the stage
+        Returns: (messages, extra keyword arguments for the model call)
+        """
+        prefix = self.get_prompt_registry().match_prefix(prompt) if self.system_prompt_prefix else None
+        if not prefix:
+            return [HumanMessage(content=prompt)], {}
+        prefix_hash = prompt_prefix_hash(prefix)
+        self.generation_metrics.record_prompt_prefix(stage_for_context(context), prefix_hash)
+        messages = [SystemMessage(content=prefix), HumanMessage(content=prompt[len(prefix):])]
+        return messages, {"prompt_cache_key": prefix_hash} if self.prompt_cache_key else {}
+    def generate_category_prompt(self, num_categories: Optional[int] = None, start: int = 1) -> str:
+        if num_categories is None:
+            num_categories = self.num_categories
+        id_rules, id_start = ID_RULES["categories"][bool(self.alias_ids)]
+        return self.get_prompt_template("categoryprompt").render(
+            store_theme=self.store_theme,
+            id_rules=id_rules,
+            schema=CATEGORY_SCHEMA,
+            count=num_categories,
+            id_start=id_start.format(start=start, next=start + 1),
+        )
+    def generate_products_prompt(self, category_info: List[Dict], num_products: Optional[int] = None, start: int = 1, avoid_names: Optional[List[str]] = None) -> str:
+        if num_products is None:
+            num_products = self.num_products
+        id_rules, id_start = ID_RULES["products"][bool(self.alias_ids)]
+        # The range keeps the prompts of concurrent shards distinct even when they cover the same categories
+        chunk_note = f"These are products {start} to {start + num_products - 1} of the catalog; other requests create the rest, so make these distinct."
+        if avoid_names:
+            chunk_note += f" Do not reuse any of these existing product names: {json.dumps(avoid_names)}"
+        return self.get_prompt_template("productprompt").render(
+            store_theme=self.store_theme,
+            id_rules=id_rules,
+            context_notes=(
+                "Categories are listed as a table with a header row. Subcategory ids have the form <category id>.<n>. "
+                "Use these exact ids for category_id and subcategory_id."
+                if self.compact_context else ""
+            ),
+            schema=HYBRID_PRODUCT_SCHEMA if self.hybrid_synthesis else PRODUCT_SCHEMA,
+            count=num_products,
+            id_start=id_start.format(start=start, next=start + 1),
+            chunk_note=chunk_note,
+            category_context=self.render_context(category_info, "product categories"),
+        )
+    def generate_users_prompt(self, category_info: List[Dict], product_info: List[Dict], num_users: Optional[int] = None, start: int = 1) -> str:
+        if num_users is None:
+            num_users = self.num_users
+        id_rules, id_start = ID_RULES["users"][bool(self.alias_ids)]
+        return self.get_prompt_template("userprompt").render(
+            store_theme=self.store_theme,
+            id_rules=id_rules,
+            context_notes=(
+                "Categories and products are listed as tables with a header row. "
+                "Use these exact ids for product_id and category_id."
+                if self.compact_context else ""
+            ),
+            schema=HYBRID_USER_SCHEMA if self.hybrid_synthesis else USER_SCHEMA,
+            count=num_users,
+            id_start=id_start.format(start=start, next=start + 1),
+            category_context=self.render_context(category_info, "user categories"),
+            product_context=self.render_context(product_info[:max(1, self.users_context_size or 1)], "user products"),
+        )
+    def parse_llm_response(self, response_content: str, context: str = "") -> tuple[bool, str, Any]:
+        """
+        Validates LLM response content and parses the JSON array it contains
+        Returns: (is_valid: bool, cleaned_content: str, records: list or None)
         """
         try:
             # Log raw response for debugging
@@ -155,324 +1885,1384 @@ class CustomComponent(Component):
                 start_idx = cleaned_content.find('[')
                 if start_idx == -1:
                     self.llog.error(f"No JSON array found in response for {context}")
-                    return False, cleaned_content
+                    return False, cleaned_content, None
                 cleaned_content = cleaned_content[start_idx:]
                 self.llog.info(f"Extracted JSON content for {context}: {cleaned_content[:500]}...")
             # Validate JSON structure
-            json.loads(cleaned_content)  # This will raise JSONDecodeError if invalid
-            return True, cleaned_content
+            records = json.loads(cleaned_content)  # This will raise JSONDecodeError if invalid
+            return True, cleaned_content, records
         except json.JSONDecodeError as e:
             self.llog.error(f"Invalid JSON in {context} at position {e.pos}: {e.msg}")
             self.llog.error(f"Problematic content: {response_content[max(0, e.pos-50):min(len(response_content), e.pos+50)]}")
-            return False, response_content
+            return False, response_content, None
         except Exception as e:
             self.llog.error(f"Unexpected error validating {context}: {str(e)}")
-            return False, response_content
+            return False, response_content, None
+    def validate_llm_response(self,response_content: str, context: str = "") -> tuple[bool, str]:
+        """
+        Validates LLM response content and ensures it's properly formatted JSON
+        Returns: (is_valid: bool, cleaned_content: str)
+        """
+        is_valid, cleaned_content, _ = self.parse_llm_response(response_content, context)
+        return is_valid, cleaned_content
+    def get_response_cache(self) -> Optional[LLMResponseCache]:
+        if not self.cache_llm_responses:
+            return None
+        try:
+            return get_response_cache(self.cache_dir or "~/.cache/ecomm-data-generator", max(1, self.cache_max_mb or 1) * 1024 * 1024)
+        except Exception as e:
+            self.llog.warning(f"Response cache unavailable, continuing without it: {str(e)}")
+            return None
+    def llm_identity(self) -> Dict:
+        """
+        Model class plus its identifying parameters (model name, temperature, ...) used in cache keys
+        """
+        params = getattr(self.llm, "_identifying_params", None)
+        if not isinstance(params, dict):
+            params = {
+                attr: getattr(self.llm, attr)
+                for attr in ("model_name", "model", "temperature", "top_p", "max_tokens")
+                if hasattr(self.llm, attr)
+            }
+        return {"class": type(self.llm).__name__, **params}
+    def get_cached_response(self, prompt: str, context: str, chunk: str = "") -> Optional[str]:
+        cache = self.get_response_cache()
+        if cache is None:
+            return None
+        try:
+            content = cache.get(LLMResponseCache.make_key(self.llm_identity(), prompt, chunk))
+        except Exception as e:
+            self.llog.warning(f"Error reading response cache for {context}: {str(e)}")
+            return None
+        if content is not None:
+            self.generation_metrics.record_cache_hit(stage_for_context(context))
+            self.llog.info(f"Using cached LLM response for {context}")
+        return content
+    def cache_response(self, prompt: str, content: str, context: str, chunk: str = "") -> None:
+        cache = self.get_response_cache()
+        if cache is None:
+            return
+        try:
+            cache.put(LLMResponseCache.make_key(self.llm_identity(), prompt, chunk), content)
+        except Exception as e:
+            self.llog.warning(f"Error writing response cache for {context}: {str(e)}")
+    async def aget_cached_response(self, prompt: str, context: str, chunk: str = "") -> Optional[str]:
+        return await asyncio.to_thread(self.get_cached_response, prompt, context, chunk)
+    async def acache_response(self, prompt: str, content: str, context: str, chunk: str = "") -> None:
+        await asyncio.to_thread(self.cache_response, prompt, content, context, chunk)
+    def get_rate_limiter(self) -> RateLimitScheduler:
+        return get_rate_limiter(
+            json.dumps(self.llm_identity(), sort_keys=True, default=str),
+            max(0, self.rate_limit_rpm or 0),
+            max(0, self.rate_limit_tpm or 0),
+            max(self.max_concurrency or 1, self.user_workers or 1),
+        )
+    def retry_delay(self, error: Exception, attempt: int) -> Optional[float]:
+        """
+        Full-jitter exponential backoff for retryable errors, never shorter than a retry-after hint
+        Returns: seconds to wait before the next attempt, or None when the call should not be retried
+        """
+        if attempt >= max(0, self.max_retries or 0) or not is_retryable_error(error):
+            return None
+        cap = max(0.0, self.retry_max_delay or 0.0)
+        delay = random.uniform(0, min(cap, max(0.0, self.retry_base_delay or 0.0) * 2 ** attempt))
+        hint = retry_after_seconds(error)
+        return max(delay, hint) if hint is not None else delay
+    def release_rate_limit(self, limiter: RateLimitScheduler, content: Any = None, error: Optional[Exception] = None, completion_tokens: Optional[int] = None) -> None:
+        throttled = error is not None and is_rate_limit_error(error)
+        if completion_tokens is None:
+            completion_tokens = estimate_tokens(content) if isinstance(content, str) and limiter.tpm > 0 else 0
+        limiter.release(completion_tokens, throttled, retry_after_seconds(error) if throttled else None)
+    def record_llm_call(self, context: str, started: float, prompt_tokens: int, response: Any = None, error: Optional[Exception] = None) -> None:
+        """
+        Records one finished invoke call, preferring provider-reported token usage over local estimates
+        """
+        reported_prompt, reported_completion = response_token_usage(response)
+        content = getattr(response, "content", None)
+        completion_tokens = reported_completion if reported_completion is not None else (estimate_tokens(content) if isinstance(content, str) else 0)
+        self.generation_metrics.record_call(
+            stage_for_context(context), time.perf_counter() - started,
+            reported_prompt if reported_prompt is not None else prompt_tokens, completion_tokens, error=error is not None,
+            cached_tokens=response_cached_tokens(response) or 0,
+        )
     def safe_llm_invoke(self, prompt: str, context: str) -> tuple[bool, str]:
         """
         Safely invokes LLM and handles response
         Returns: (success: bool, content: str)
         """
-        try:
-            self.log(f"Sending prompt for {context}")
-            response = self.llm.invoke([HumanMessage(content=prompt)])
-
-            if not response or not hasattr(response, 'content'):
-                self.llog.error(f"Invalid response object for {context}")
-                return False, "Invalid LLM response object"
+        success, content = run_sync(self.acall_llm(prompt, context))
+        if not success:
+            return False, content
+        return self.validate_llm_response(content, context)
+    def get_structured_llm(self, table: str) -> Optional[Any]:
+        """
+        The connected model bound to the table's record model with with_structured_output, built once per table
+        Returns: None when structured output is off or not supported by the model
+        """
+        if not self.structured_output or self._structured_unsupported or not hasattr(self.llm, "with_structured_output"):
+            return None
+        if self._structured_llms is None:
+            self._structured_llms = {}
+        key = (table, bool(self.hybrid_synthesis))
+        if key not in self._structured_llms:
+            try:
+                self._structured_llms[key] = self.llm.with_structured_output(get_record_list_model(table, bool(self.hybrid_synthesis)), include_raw=True)
+            except NotImplementedError:
+                self.llog.warning(f"{self.llm.__class__.__name__} does not support structured output, using JSON text responses")
+                self._structured_unsupported = True
+                return None
+        return self._structured_llms[key]
+    def finish_structured_call(self, success: bool, response: Any, prompt: str, context: str) -> Optional[tuple[bool, Any]]:
+        """
+        Extracts the records of a structured output response
+        Only a rejected schema or tool call switches to JSON text responses; other failures are returned as they
+        are, since resending the prompt as text would pay for the same timeout or quota error twice
+        Returns: (success: bool, records or error message: str), or None when the caller should fall back to a JSON text response
+        """
+        if not success:
+            if not is_structured_output_rejection(response):
+                return False, str(response)
+            self.llog.warning(f"{self.llm.__class__.__name__} rejected structured output for {context}, using JSON text responses from now on: {response}")
+            self._structured_unsupported = True
+            return None
+        parsed = response.get("parsed") if isinstance(response, dict) else response
+        if parsed is None:
+            error = response.get("parsing_error") if isinstance(response, dict) else None
+            self.generation_metrics.record_reject(stage_for_context(context), "schema_mismatch")
+            self.llog.warning(f"Structured output for {context} did not match the record model, retrying as JSON text: {error}")
+            return None
+        records = [record.model_dump() if hasattr(record, "model_dump") else record for record in getattr(parsed, "records", None) or []]
+        return True, records
+    def generate_followup_prompt(self, prompt: str, existing: List[Dict]) -> str:
+        names = [str(record.get("name")) for record in existing if isinstance(record, dict) and record.get("name")]
+        return (
+            f"{prompt}\n"
+            f"The following {len(names)} entries were already generated. Do not repeat any of them: {json.dumps(names[:100])}"
+        )
+    def salvage_llm_response(self, response_content: str, context: str) -> List[Any]:
+        """
+        Recovers every complete top-level record from a truncated or malformed JSON array
+        """
+        parser = IncrementalJSONArrayParser()
+        records = parser.feed(response_content)
+        self.generation_metrics.record_reject(stage_for_context(context), "invalid_json", parser.objects_invalid)
+        message = (
+            f"Salvaged {len(records)} complete records from malformed response for {context}"
+            f" ({parser.objects_invalid} malformed, {'truncated' if not parser.closed else 'not truncated'})"
+        )
+        self.log(message)
+        self.llog.warning(message)
+        return records
+    def merge_followup_records(self, records: List[Any], seen_ids: set, summaries: List[Dict], additional: List[Any]) -> None:
+        for record in records:
+            record_id = record.get("id") if isinstance(record, dict) else None
+            if record_id is not None and record_id in seen_ids:
+                continue
+            seen_ids.add(record_id)
+            additional.append(record)
+            summaries.append(record)
+    def finish_stream(self, parser: IncrementalJSONArrayParser, context: str) -> None:
+        """
+        Logs the outcome of a streamed response
+        Raises ValueError if no JSON array was found in the stream
+        """
+        if not parser.started:
+            self.llog.error(f"No JSON array found in streamed response for {context}")
+            raise ValueError("No JSON array found in streamed response")
+        if parser.objects_invalid:
+            self.generation_metrics.record_reject(stage_for_context(context), "invalid_json", parser.objects_invalid)
+            self.llog.warning(f"Skipped {parser.objects_invalid} malformed records in streamed response for {context}")
+        if not parser.closed:
+            self.llog.warning(f"Streamed response for {context} was truncated, dropped the incomplete trailing record")
+        self.llog.info(f"Parsed {parser.objects_parsed} records from streamed response for {context}")
+    def llm_timeout_seconds(self) -> Optional[float]:
+        return self.llm_timeout if self.llm_timeout and self.llm_timeout > 0 else None
+    async def ainvoke_llm(self, prompt: str, context: str, llm: Any = None) -> tuple[bool, Any]:
+        """
+        Invokes llm (the connected model by default) with ainvoke through the shared rate limiter, retrying
+        transient failures with backoff; every attempt is bounded by llm_timeout and cancellation is propagated
+        Returns: (success: bool, response or the final error: Exception)
+        """
+        llm = llm or self.llm
+        limiter = self.get_rate_limiter()
+        prompt_tokens = estimate_tokens(prompt)
+        messages, call_kwargs = self.prompt_request(prompt, context)
+        attempt = 0
+        while True:
+            await limiter.aacquire(prompt_tokens)
+            started = time.perf_counter()
+            try:
+                self.log(f"Sending prompt for {context}")
+                response = await asyncio.wait_for(llm.ainvoke(messages, **call_kwargs), timeout=self.llm_timeout_seconds())
+            except asyncio.CancelledError:
+                self.release_rate_limit(limiter)
+                raise
+            except Exception as e:
+                self.record_llm_call(context, started, prompt_tokens, error=e)
+                self.release_rate_limit(limiter, error=e)
+                delay = self.retry_delay(e, attempt)
+                if delay is None:
+                    if isinstance(e, asyncio.TimeoutError):
+                        self.llog.error(f"LLM call for {context} timed out after {self.llm_timeout}s")
+                        return False, asyncio.TimeoutError(f"LLM call timed out after {self.llm_timeout}s")
+                    self.log(f"Error invoking LLM for {context}: {str(e)}")
+                    self.llog.error(f"Error invoking LLM for {context}: {str(e)}")
+                    return False, e
+                attempt += 1
+                self.generation_metrics.record_retry(stage_for_context(context))
+                self.llog.warning(f"Retrying {context} in {delay:.1f}s (attempt {attempt + 1}) after error: {str(e) or type(e).__name__}")
+                await asyncio.sleep(delay)
+                continue
+            raw = response.get("raw") if isinstance(response, dict) else response
+            self.record_llm_call(context, started, prompt_tokens, raw)
+            self.release_rate_limit(limiter, getattr(raw, "content", None))
+            return True, response
+    async def acall_llm(self, prompt: str, context: str, chunk: str = "") -> tuple[bool, str]:
+        """
+        Invokes the LLM and returns the raw response text, served from the response cache when possible
+        Returns: (success: bool, content: str)
+        """
+        cached = await self.aget_cached_response(prompt, context, chunk)
+        if cached is not None:
+            return True, cached
+        success, response = await self.ainvoke_llm(prompt, context)
+        if not success:
+            return False, str(response)
 
-            is_valid, content = self.validate_llm_response(response.content, context)
-            return is_valid, content
+        if not response or not hasattr(response, 'content'):
+            self.llog.error(f"Invalid response object for {context}")
+            return False, "Invalid LLM response object"
 
+        return True, response.content
+    async def acall_structured_llm(self, prompt: str, context: str, table: str, chunk: str = "") -> Optional[tuple[bool, Any]]:
+        """
+        Requests the records of a table through the model's native structured output mode, so the response
+        arrives already parsed and validated against the record model; served from the response cache when possible
+        Returns: (success: bool, records or error message: str), or None when the caller should fall back to a JSON text response
+        """
+        structured_llm = self.get_structured_llm(table)
+        if structured_llm is None:
+            return None
+        cached = await self.aget_cached_response(prompt, context, chunk)
+        if cached is not None:
+            is_valid, _, records = self.parse_llm_response(cached, context)
+            if is_valid:
+                return True, records
+        success, response = await self.ainvoke_llm(prompt, context, structured_llm)
+        result = self.finish_structured_call(success, response, prompt, context)
+        if result is not None and result[0]:
+            await self.acache_response(prompt, json.dumps(result[1]), context, chunk)
+        return result
+    async def astream_llm_records(self, prompt: str, context: str, parser: IncrementalJSONArrayParser, chunk: str = "") -> AsyncIterator[Any]:
+        """
+        Streams the LLM response with astream and yields each top-level array element as soon as it is complete;
+        the whole stream is bounded by llm_timeout. The caller owns parser and can check parser.closed afterwards
+        Raises ValueError if the stream produced no records at all
+        """
+        cached = await self.aget_cached_response(prompt, context, chunk)
+        if cached is not None:
+            for record in parser.feed(cached):
+                yield record
+            return
+        received: Optional[List[str]] = [] if self.cache_llm_responses else None
+        timeout = self.llm_timeout_seconds()
+        deadline = None if timeout is None else asyncio.get_running_loop().time() + timeout
+        limiter = self.get_rate_limiter()
+        prompt_tokens = estimate_tokens(prompt)
+        messages, call_kwargs = self.prompt_request(prompt, context)
+        await limiter.aacquire(prompt_tokens)
+        streamed_chars = 0
+        stream_error: Optional[Exception] = None
+        started = time.perf_counter()
+        first_token: Optional[float] = None
+        self.log(f"Streaming prompt for {context}")
+        stream = self.llm.astream(messages, **call_kwargs).__aiter__()
+        try:
+            while True:
+                remaining = None if deadline is None else max(0.0, deadline - asyncio.get_running_loop().time())
+                try:
+                    chunk = await asyncio.wait_for(stream.__anext__(), timeout=remaining)
+                except StopAsyncIteration:
+                    break
+                content = getattr(chunk, "content", chunk)
+                if not isinstance(content, str) or not content:
+                    continue
+                if first_token is None:
+                    first_token = time.perf_counter() - started
+                streamed_chars += len(content)
+                if received is not None:
+                    received.append(content)
+                for record in parser.feed(content):
+                    yield record
+        except asyncio.TimeoutError as e:
+            stream_error = e
+            self.llog.error(f"Streaming LLM response for {context} timed out after {self.llm_timeout}s")
+            if not parser.objects_parsed:
+                raise ValueError(f"Streaming LLM response timed out after {self.llm_timeout}s") from e
+            received = None
         except Exception as e:
-            self.log(f"Error invoking LLM for {context}: {str(e)}")
-            self.llog.error(f"Error invoking LLM for {context}: {str(e)}")
-            return False, str(e)
-    def create_categories(self) -> List[Data]:
-        success, response_content = self.safe_llm_invoke(
-            prompt=self.generate_category_prompt(),
-            context="category generation"
-        )
+            stream_error = e
+            self.llog.error(f"Error streaming LLM response for {context}: {str(e)}")
+            if not parser.objects_parsed:
+                raise ValueError(f"Error streaming LLM response: {str(e)}") from e
+            received = None
+        finally:
+            self.generation_metrics.record_call(
+                stage_for_context(context), time.perf_counter() - started, prompt_tokens,
+                (streamed_chars + 3) // 4, first_token, error=stream_error is not None,
+            )
+            self.release_rate_limit(limiter, error=stream_error, completion_tokens=(streamed_chars + 3) // 4)
+            if hasattr(stream, "aclose"):
+                await stream.aclose()
+        self.finish_stream(parser, context)
+        if parser.closed and not parser.objects_invalid and received is not None:
+            await self.acache_response(prompt, "".join(received), context, chunk)
+    async def arequest_remainder(self, existing: List[Dict], expected_count: Optional[int], followup_prompt: Optional[Callable[[int, List[Dict]], str]], context: str, chunk: str = "") -> List[Any]:
+        """
+        Requests only the records missing from a salvaged response with follow-up prompts
+        Returns: the additional records, without ids that were already generated
+        """
+        if not expected_count or followup_prompt is None:
+            return []
+        seen_ids = {record.get("id") for record in existing if isinstance(record, dict)}
+        summaries = list(existing)
+        additional: List[Any] = []
+        for attempt in range(max(0, self.max_followup_requests or 0)):
+            missing = expected_count - len(summaries)
+            if missing <= 0:
+                break
+            followup_context = f"{context} follow-up {attempt + 1} ({missing} missing)"
+            prompt = followup_prompt(missing, summaries)
+            success, content = await self.acall_llm(prompt, followup_context, chunk)
+            if not success:
+                break
+            is_valid, _, records = self.parse_llm_response(content, followup_context)
+            if is_valid:
+                await self.acache_response(prompt, content, followup_context, chunk)
+            else:
+                records = self.salvage_llm_response(content, followup_context)
+            self.merge_followup_records(records, seen_ids, summaries, additional)
+        return additional
+    async def astream_records(self, prompt: str, context: str, expected_count: Optional[int] = None, followup_prompt: Optional[Callable[[int, List[Dict]], str]] = None, table: Optional[str] = None, chunk: str = "") -> AsyncIterator[Any]:
+        """
+        Yields the records of a generation request as they become available: one by one while the response streams
+        when stream_output is enabled, followed by the remainder of a truncated stream, otherwise all at once
+        Raises ValueError when the request failed
+        """
+        if not (self.stream_output and hasattr(self.llm, "astream")):
+            success, records = await self.agenerate_records(prompt, context, expected_count, followup_prompt, table, chunk)
+            if not success:
+                raise ValueError(records)
+            for record in records:
+                yield record
+            return
+        parser = IncrementalJSONArrayParser()
+        summaries: List[Dict] = []
+        async for record in self.astream_llm_records(prompt, context, parser, chunk):
+            if isinstance(record, dict):
+                summaries.append({"id": record.get("id"), "name": record.get("name")})
+            yield record
+        if not parser.closed and self.salvage_partial:
+            for record in await self.arequest_remainder(summaries, expected_count, followup_prompt, context, chunk):
+                yield record
+    async def agenerate_records(self, prompt: str, context: str, expected_count: Optional[int] = None, followup_prompt: Optional[Callable[[int, List[Dict]], str]] = None, table: Optional[str] = None, chunk: str = "") -> tuple[bool, Any]:
+        """
+        Requests a JSON array from the LLM, streaming it when stream_output is enabled, or the table's records
+        through native structured output when the model supports it.
+        Broken responses are salvaged per record and the missing remainder is requested with followup_prompt
+        Returns: (success: bool, records: list of dicts or error message: str)
+        """
+        if self.stream_output and hasattr(self.llm, "astream"):
+            try:
+                return True, [record async for record in self.astream_records(prompt, context, expected_count, followup_prompt, chunk=chunk)]
+            except ValueError as e:
+                return False, str(e)
+        if table:
+            result = await self.acall_structured_llm(prompt, context, table, chunk)
+            if result is not None:
+                return result
+        success, content = await self.acall_llm(prompt, context, chunk)
+        if not success:
+            return False, content
+        is_valid, cleaned_content, records = self.parse_llm_response(content, context)
+        if is_valid:
+            await self.acache_response(prompt, content, context, chunk)
+        else:
+            if not self.salvage_partial:
+                return False, cleaned_content
+            records = self.salvage_llm_response(content, context)
+            if not records:
+                return False, cleaned_content
+            records.extend(await self.arequest_remainder(records, expected_count, followup_prompt, context, chunk))
+        return True, records
+    def process_categories(self, categories: Iterable[Dict]) -> List[Data]:
+        processed: List[Data] = []
+        parsed = 0
+        rejected: Counter = Counter()
+        for category in categories:
+            parsed += 1
+            try:
+                name = category.get("name", "")
+                if not name:
+                    self.llog.warning(f"Category missing name: {category}")
+                    rejected["missing_field"] += 1
+                    continue
+                description = category.get("description", "")
+                category_extra: Dict = {}
+                category_id = self.assign_record_id(category, category_extra)
+                if not category_id:
+                    self.llog.warning(f"Category missing ID: {category}")
+                    rejected["missing_field"] += 1
+                    continue                   
+                processed.append(Data(
+                    data={
+                        "text": f"{name} {description}",
+                        "id": category_id,
+                        "name": name,
+                        "description": description,
+                        **category_extra,
+                    }
+                ))
+                # Process subcategories
+                subcategories = category.get("subcategories", [])
+                self.llog.debug(f"Processing {len(subcategories)} subcategories for {name}")
+                for subcategory in subcategories:
+                    parsed += 1
+                    try:
+                        sub_name = subcategory.get("name", "")
+                        if not sub_name:
+                            self.llog.warning(f"Subcategory missing name: {subcategory}")
+                            rejected["missing_field"] += 1
+                            continue
+                        sub_extra: Dict = {}
+                        sub_id = self.assign_record_id(subcategory, sub_extra)
+                        if not sub_id:
+                            self.llog.warning(f"Subcategory missing ID: {subcategory}")
+                            rejected["missing_field"] += 1
+                            continue
+                        processed.append(Data(
+                            data={
+                                "text": f"{sub_name} {subcategory.get('description', '')}",
+                                "id": sub_id,
+                                "name": sub_name,
+                                "description": subcategory.get("description", ""),
+                                "parent_id": category_id if self.alias_ids else subcategory.get("parent_id"),
+                                **sub_extra,
+                            }
+                        ))
+                    except Exception as e:
+                        self.llog.error(f"Error processing subcategory: {str(e)}")
+                        rejected["error"] += 1
+                        continue
+            except Exception as e:
+                self.llog.error(f"Error processing category: {str(e)}")
+                rejected["error"] += 1
+                continue
+        self.record_validation("categories", parsed, len(processed), rejected)
+        return processed
+    def category_request(self) -> Dict:
+        start = sum(1 for cat in self.all_categories if "parent_id" not in cat.data) + 1
+        return {
+            "prompt": self.generate_category_prompt(None, start),
+            "context": "category generation",
+            "expected_count": self.num_categories,
+            "table": "categories",
+            "chunk": f"categories-{start}-{self.num_categories}",
+            "followup_prompt": lambda missing, existing: self.generate_followup_prompt(self.generate_category_prompt(missing, start + len(existing)), existing),
+        }
+    def store_categories(self, success: bool, categories: Any, checkpoint_key: Optional[str] = None) -> List[Data]:
         if not success:
             return [Data(data={"text": "Error generating categories", 
-                              "error": f"Failed to get valid response: {response_content}"})]
+                              "error": f"Failed to get valid response: {categories}"})]
         try:
-            categories = json.loads(response_content)
-            self.llog.info(f"Successfully generated {len(categories)} categories")
             # Process categories with detailed logging
-            for category in categories:
-                try:
-                    name = category.get("name", "")
-                    if not name:
-                        self.llog.warning(f"Category missing name: {category}")
-                        continue
-                    description = category.get("description", "")
-                    category_id = category.get("id")
-                    if not category_id:
-                        self.llog.warning(f"Category missing ID: {category}")
-                        continue                   
-                    self.all_categories.append(Data(
-                        data={
-                            "text": f"{name} {description}",
-                            "id": category_id,
-                            "name": name,
-                            "description": description,
-                        }
-                    ))
-                    # Process subcategories
-                    subcategories = category.get("subcategories", [])
-                    self.llog.debug(f"Processing {len(subcategories)} subcategories for {name}")
-                    for subcategory in subcategories:
-                        try:
-                            sub_name = subcategory.get("name", "")
-                            if not sub_name:
-                                self.llog.warning(f"Subcategory missing name: {subcategory}")
-                                continue
-                            sub_id = subcategory.get("id")
-                            if not sub_id:
-                                self.llog.warning(f"Subcategory missing ID: {subcategory}")
-                                continue
-                            self.all_categories.append(Data(
-                                data={
-                                    "text": f"{sub_name} {subcategory.get('description', '')}",
-                                    "id": sub_id,
-                                    "name": sub_name,
-                                    "description": subcategory.get("description", ""),
-                                    "parent_id": subcategory.get("parent_id"),
-                                }
-                            ))
-                        except Exception as e:
-                            self.llog.error(f"Error processing subcategory: {str(e)}")
-                            continue
-                except Exception as e:
-                    self.llog.error(f"Error processing category: {str(e)}")
-                    continue
-            self.llog.info(f"Successfully processed {len(self.all_categories)} total categories and subcategories")
-            return self.all_categories
+            processed = self.process_categories(categories)
+            if checkpoint_key:
+                self.save_checkpoint(checkpoint_key, processed)
+            return self.add_categories(processed)
         except Exception as e:
             self.llog.error(f"Error processing categories response: {str(e)}")
             return [Data(data={"text": "Error processing categories", 
                               "error": f"Failed to process response: {str(e)}"})]
-    def create_products(self) -> List[Data]:
-        if not self.all_categories:
-            self.llog.error("Attempting to create products without categories")
-            return [Data(data={
-                "text": "Error: No categories available",
-                "error": "Categories must be generated first"
-            })]
+    def add_categories(self, categories: List[Data]) -> List[Data]:
+        self.all_categories.extend(categories)
+        self.category_index = self.build_index(self.all_categories)
+        self.refresh_context_aliases()
+        self.llog.info(f"Successfully processed {len(self.all_categories)} total categories and subcategories")
+        self.status = self.stage_status()
+        return self.all_categories
+    def create_categories(self) -> List[Data]:
+        return run_sync(self.acreate_categories())
+    async def acreate_categories(self) -> List[Data]:
+        await asyncio.to_thread(self.begin_checkpointed_stage, "categories")
+        stored = await self.aload_checkpoint("categories")
+        if stored is not None:
+            return self.add_categories(stored)
+        success, categories = await self.agenerate_records(**self.category_request())
+        return await asyncio.to_thread(self.store_categories, success, categories, "categories")
+    async def arun_concurrently(self, tasks: List[Callable[[], Awaitable[Any]]], context: str, max_workers: Optional[int] = None) -> List[tuple[bool, Any]]:
+        """
+        Runs coroutine factories on the event loop, at most max_workers (defaults to max_concurrency) at a time
+        Cancelling the caller cancels every pending task
+        Returns: list of (success: bool, result or error message) in task order
+        """
+        semaphore = asyncio.Semaphore(max(1, max_workers or self.max_concurrency or 1))
+        async def run(index: int, task: Callable[[], Awaitable[Any]]) -> tuple[bool, Any]:
+            async with semaphore:
+                try:
+                    return True, await task()
+                except Exception as e:
+                    self.llog.error(f"Error in {context} chunk {index + 1}/{len(tasks)}: {str(e)}")
+                    return False, str(e)
+        return list(await asyncio.gather(*(run(index, task) for index, task in enumerate(tasks))))
+    def parse_price_range(self, value: Any) -> Optional[tuple[float, float]]:
+        """
+        Parses "min-max" strings or [min, max] pairs into a positive price range
+        """
+        try:
+            if isinstance(value, str):
+                low, high = (float(part) for part in value.replace(" ", "").split("-", 1))
+            else:
+                low, high = (float(part) for part in value)
+        except (TypeError, ValueError):
+            return None
+        if low <= 0 or high < low:
+            return None
+        return low, high
+    def price_range_for(self, product: Dict, ranges: Dict[str, tuple[float, float]], default: tuple[float, float]) -> tuple[float, float]:
+        for key in ("subcategory_id", "category_id"):
+            category = self.category_index.get(product.get(key))
+            if category is None:
+                continue
+            for candidate in (category.data.get("id"), category.data.get("name"), category.data.get("alias")):
+                if candidate in ranges:
+                    return ranges[candidate]
+        return default
+    def synthesize_product_fields(self, products: List[Data]) -> None:
+        """
+        Fills price, inventory, ratings and shipping_info of hybrid-mode products in one batch
+        from seeded distributions: log-uniform prices within the category's range, log-normal stock,
+        Zipf review counts and Beta-distributed scores
+        """
+        if not products:
+            return
+        default = self.parse_price_range(self.price_range) or (5.0, 500.0)
+        configured = self.category_price_ranges or {}
+        if isinstance(configured, list):
+            configured = {key: value for item in configured if isinstance(item, dict) for key, value in item.items()}
+        ranges = {}
+        for key, value in configured.items():
+            parsed = self.parse_price_range(value)
+            if parsed is None:
+                self.llog.warning(f"Ignoring invalid price range {value} for {key}")
+                continue
+            ranges[key] = parsed
+        size = len(products)
+        sampler = NumericFieldSampler((self.seed or 0) + len(self.all_products))
+        bounds = [self.price_range_for(p.data, ranges, default) for p in products]
+        prices = sampler.log_uniform([low for low, _ in bounds], [high for _, high in bounds])
+        stock_counts = sampler.lognormal(size, 3.5, 1.0)
+        review_counts = sampler.zipf(size, 1.8, 20000)
+        scores = sampler.beta(size, 5.0, 1.5)
+        weights = sampler.lognormal(size, 0.5, 0.8)
+        handling_times = sampler.choice(HANDLING_TIMES, size)
+        warehouses = sampler.choice(WAREHOUSE_LOCATIONS, size)
+        for index, product in enumerate(products):
+            data = product.data
+            # The model may return specifications as free text instead of an object
+            specifications = data.get("specifications")
+            weight = specifications.get("weight") if isinstance(specifications, dict) else None
+            low, high = bounds[index]
+            price = min(max(math.floor(prices[index]) + 0.99, low), high)
+            data["price"] = round(price, 2)
+            data["inventory"] = {
+                "stock_count": int(stock_counts[index]),
+                "sku": f"SKU-{len(self.all_products) + index + 1:06d}",
+                "warehouse_location": warehouses[index],
+            }
+            data["ratings"] = {
+                "average_score": round(1 + 4 * scores[index], 1),
+                "review_count": int(review_counts[index]),
+            }
+            data["shipping_info"] = {
+                "free_shipping": price >= 50,
+                "shipping_weight": weight or f"{weights[index]:.1f} lbs",
+                "handling_time": handling_times[index],
+            }
+    def synthesize_user_fields(self, users: List[Data]) -> None:
+        """
+        Fills purchase dates of hybrid-mode users in one batch, uniformly between join date and last login
+        """
+        purchases = [(user, purchase) for user in users for purchase in user.data.get("purchase_history", [])]
+        if not purchases:
+            return
+        sampler = NumericFieldSampler((self.seed or 0) + len(self.all_users))
+        fractions = sampler.uniform(len(purchases))
+        today = date.today()
+        for (user, purchase), fraction in zip(purchases, fractions):
+            try:
+                start = date.fromisoformat(str(user.data.get("join_date"))[:10])
+            except ValueError:
+                start = today - timedelta(days=365)
+            try:
+                end = date.fromisoformat(str(user.data.get("last_login"))[:10])
+            except ValueError:
+                end = today
+            end = max(start, min(end, today))
+            purchase["purchase_date"] = (start + timedelta(days=int(fraction * (end - start).days))).isoformat()
+    def price_user_purchases(self, users: List[Data]) -> None:
+        """
+        Sets each verified purchase's price from the product index and computes total_spent
+        with one vectorized sum over all purchases instead of trusting LLM arithmetic
+        """
+        owners: List[int] = []
+        prices: List[float] = []
+        for user_index, user in enumerate(users):
+            for purchase in user.data.get("purchase_history", []):
+                product = self.product_index.get(purchase.get("product_id"))
+                price = float(product.data.get("price") or 0) if product is not None else 0.0
+                purchase["price"] = price
+                owners.append(user_index)
+                prices.append(price)
         try:
-            # Prepare category information for prompt
-            category_info = []
+            import numpy as np
+        except ImportError:
+            np = None
+        if np is not None:
+            totals = np.bincount(np.asarray(owners, dtype=np.int64), weights=np.asarray(prices, dtype=float), minlength=len(users)).tolist()
+        else:
+            per_user: List[List[float]] = [[] for _ in users]
+            for owner, price in zip(owners, prices):
+                per_user[owner].append(price)
+            totals = [math.fsum(user_prices) for user_prices in per_user]
+        for user, total in zip(users, totals):
+            user.data["total_spent"] = round(total, 2)
+    def build_product_category_info(self, categories: List[Data]) -> List[Any]:
+        if self.compact_context:
+            return [
+                {"id": cat.data["id"], "name": cat.data["name"]}
+                for cat in categories
+                if cat.data.get("id") and cat.data.get("name")
+            ]
+        category_info = []
+        for cat in categories:
+            cat_data = cat.data
+            try:
+                if "parent_id" not in cat_data:
+                    category_info.append(f"Category ID: {self.display_id(cat_data['id'])}, Name: {cat_data['name']}")
+                else:
+                    category_info.append(
+                        f"Subcategory ID: {self.display_id(cat_data['id'])}, "
+                        f"Name: {cat_data['name']}, "
+                        f"Parent ID: {self.display_id(cat_data['parent_id'])}"
+                    )
+            except KeyError as e:
+                self.llog.warning(f"Missing required field in category data: {e}")
+                continue
+        return category_info
+    def plan_product_shards(self) -> List[Dict]:
+        """
+        Splits num_products into shards of at most products_per_shard products
+        Returns: list of {"count": int, "categories": List[Data], "start": int}
+        """
+        shards = self.plan_product_shard_scopes()
+        start = len(self.all_products) + 1
+        for shard in shards:
+            shard["start"] = start
+            start += shard["count"]
+        return shards
+    def plan_product_shard_scopes(self) -> List[Dict]:
+        shard_size = max(1, self.products_per_shard or 1)
+        if self.shard_strategy == "subcategory":
+            parents = {c.data.get("id"): c for c in self.all_categories if "parent_id" not in c.data}
+            scopes = []
             for cat in self.all_categories:
-                cat_data = cat.data
-                try:
-                    if "parent_id" not in cat_data:
-                        category_info.append(f"Category ID: {cat_data['id']}, Name: {cat_data['name']}")
-                    else:
-                        category_info.append(
-                            f"Subcategory ID: {cat_data['id']}, "
-                            f"Name: {cat_data['name']}, "
-                            f"Parent ID: {cat_data['parent_id']}"
-                        )
-                except KeyError as e:
-                    self.llog.warning(f"Missing required field in category data: {e}")
+                if "parent_id" not in cat.data:
                     continue
-            self.llog.info(f"Prepared {len(category_info)} categories for product generation")
-            # Generate products using LLM
-            success, response_content = self.safe_llm_invoke(
-                prompt=self.generate_products_prompt(category_info),
-                context="product generation"
-            )
-            if not success:
-                return [Data(data={
-                    "text": "Error generating products",
-                    "error": f"Failed to get valid response: {response_content}"
-                })]
-            # Process products
-            products = json.loads(response_content)
-            self.llog.info(f"Successfully generated {len(products)} products")
-            for product in products:
-                try:
-                    # Validate required fields
-                    required_fields = ["id", "name", "description", "category_id", "subcategory_id", "price"]
-                    missing_fields = [field for field in required_fields if not product.get(field)]
-                    if missing_fields:
-                        self.llog.warning(f"Product missing required fields {missing_fields}: {product}")
-                        continue
-                    # Validate category references
-                    category_id = product["category_id"]
-                    subcategory_id = product["subcategory_id"]
-                    if not any(c.data["id"] == category_id for c in self.all_categories):
-                        self.llog.warning(f"Product references invalid category_id {category_id}")
-                        continue
-                    if not any(c.data["id"] == subcategory_id for c in self.all_categories):
-                        self.llog.warning(f"Product references invalid subcategory_id {subcategory_id}")
+                parent = parents.get(cat.data.get("parent_id"))
+                if parent is None:
+                    self.llog.warning(f"Skipping subcategory {cat.data.get('id')} with unknown parent for sharding")
+                    continue
+                scopes.append([parent, cat])
+            if scopes:
+                # Interleave the subcategories of different parents so leftover products spread across parents
+                rank: Counter = Counter()
+                ranked = []
+                for scope in scopes:
+                    parent_id = scope[0].data.get("id")
+                    ranked.append((rank[parent_id], scope))
+                    rank[parent_id] += 1
+                scopes = [scope for _, scope in sorted(ranked, key=lambda item: item[0])]
+                shards = []
+                # Scopes left with less than a shard share calls instead of paying for an LLM call each
+                merged: Dict[str, Any] = {"count": 0, "categories": []}
+                base, extra = divmod(self.num_products, len(scopes))
+                for index, scope in enumerate(scopes):
+                    full, rest = divmod(base + (1 if index < extra else 0), shard_size)
+                    shards.extend({"count": shard_size, "categories": scope} for _ in range(full))
+                    if not rest:
                         continue
-                    # Validate numeric fields
+                    if merged["count"] + rest > shard_size:
+                        shards.append(merged)
+                        merged = {"count": 0, "categories": []}
+                    merged["count"] += rest
+                    merged["categories"].extend(cat for cat in scope if all(cat is not other for other in merged["categories"]))
+                if merged["count"]:
+                    shards.append(merged)
+                return shards
+            self.llog.warning("No usable subcategories for sharding, falling back to fixed-size shards")
+        return [
+            {"count": min(shard_size, self.num_products - start), "categories": self.all_categories}
+            for start in range(0, self.num_products, shard_size)
+        ]
+    def validate_products(self, products: Iterable[Dict]) -> List[Data]:
+        validated: List[Data] = []
+        parsed = 0
+        rejected: Counter = Counter()
+        for product in products:
+            parsed += 1
+            try:
+                # Validate required fields
+                required_fields = ["id", "name", "description", "category_id", "subcategory_id"]
+                if not self.hybrid_synthesis:
+                    required_fields.append("price")
+                missing_fields = [field for field in required_fields if not product.get(field)]
+                if missing_fields:
+                    self.llog.warning(f"Product missing required fields {missing_fields}: {product}")
+                    rejected["missing_field"] += 1
+                    continue
+                product_extra: Dict = {}
+                product_id = self.assign_record_id(product, product_extra)
+                # Validate category references
+                category_id = self.resolve_reference(product["category_id"])
+                subcategory_id = self.resolve_reference(product["subcategory_id"])
+                if category_id not in self.category_index:
+                    self.llog.warning(f"Product references invalid category_id {category_id}")
+                    rejected["bad_category_ref"] += 1
+                    continue
+                if subcategory_id not in self.category_index:
+                    self.llog.warning(f"Product references invalid subcategory_id {subcategory_id}")
+                    rejected["bad_category_ref"] += 1
+                    continue
+                # Validate numeric fields, synthesized later in hybrid mode
+                price = None
+                if not self.hybrid_synthesis:
                     try:
                         price = float(product["price"])
                         if price <= 0:
                             self.llog.warning(f"Invalid price {price} for product {product['id']}")
+                            rejected["bad_price"] += 1
                             continue
                     except (ValueError, TypeError):
                         self.llog.warning(f"Invalid price format for product {product['id']}")
+                        rejected["bad_price"] += 1
                         continue
-                    # Add validated product
-                    self.all_products.append(Data(
-                        data={
-                            "text": f"Product: {product['name']} - {product['description']}",
-                            "id": product["id"],
-                            "name": product["name"],
-                            "description": product["description"],
-                            "category_id": category_id,
-                            "subcategory_id": subcategory_id,
-                            "price": price,
-                            "specifications": product.get("specifications", {}),
-                            "inventory": product.get("inventory", {}),
-                            "ratings": product.get("ratings", {}),
-                            "shipping_info": product.get("shipping_info", {})
-                        }
-                    ))
-                except Exception as e:
-                    self.llog.error(f"Error processing product: {str(e)}")
+                # Add validated product
+                validated.append(Data(
+                    data={
+                        "text": f"Product: {product['name']} - {product['description']}",
+                        "id": product_id,
+                        "name": product["name"],
+                        "description": product["description"],
+                        "category_id": category_id,
+                        "subcategory_id": subcategory_id,
+                        "price": price,
+                        "specifications": product.get("specifications", {}),
+                        "inventory": product.get("inventory", {}),
+                        "ratings": product.get("ratings", {}),
+                        "shipping_info": product.get("shipping_info", {}),
+                        **product_extra
+                    }
+                ))
+            except Exception as e:
+                self.llog.error(f"Error processing product: {str(e)}")
+                rejected["error"] += 1
+                continue
+        self.record_validation("products", parsed, len(validated), rejected)
+        return validated
+    def existing_product_names(self, categories: List[Data], limit: int = 50) -> List[str]:
+        """
+        Names of the most recently stored products in the given categories, for the avoid-names hint of product prompts
+        """
+        category_ids = {c.data.get("id") for c in categories}
+        names: List[str] = []
+        for product in reversed(self.all_products):
+            if len(names) >= limit:
+                break
+            if product.data.get("name") and (product.data.get("subcategory_id") in category_ids or product.data.get("category_id") in category_ids):
+                names.append(product.data["name"])
+        return names
+    def product_chunk_request(self, count: int, categories: List[Data], context: str, start: int = 1) -> Dict:
+        category_info = self.build_product_category_info(categories)
+        return {
+            "prompt": self.generate_products_prompt(category_info, count, start, self.existing_product_names(categories)),
+            "context": context,
+            "expected_count": count,
+            "followup_prompt": lambda missing, existing: self.generate_followup_prompt(self.generate_products_prompt(category_info, missing, start + len(existing)), existing),
+            "table": "products",
+            "chunk": f"products-{start}-{count}",
+        }
+    def store_product_chunk(self, success: bool, products: Any, context: str) -> List[Data]:
+        if not success:
+            raise ValueError(f"Failed to get valid response: {products}")
+        validated = self.validate_products(products)
+        self.llog.info(f"Successfully validated {len(validated)} products for {context}")
+        return validated
+    async def agenerate_product_chunk(self, count: int, categories: List[Data], context: str, start: int = 1) -> List[Data]:
+        """
+        Generates and validates one chunk of products
+        Raises ValueError when the LLM response is unusable so that a failed chunk can be skipped
+        """
+        key = f"products-{start}-{count}"
+        stored = await self.aload_checkpoint(key)
+        if stored is not None:
+            return stored
+        success, products = await self.agenerate_records(**self.product_chunk_request(count, categories, context, start))
+        validated = self.store_product_chunk(success, products, context)
+        await self.asave_checkpoint(key, validated)
+        return validated
+    def check_product_prerequisites(self) -> Optional[List[Data]]:
+        if not self.all_categories:
+            self.llog.error("Attempting to create products without categories")
+            return [Data(data={
+                "text": "Error: No categories available",
+                "error": "Categories must be generated first"
+            })]
+        if not self.category_index:
+            self.category_index = self.build_index(self.all_categories)
+        self.llog.info(f"Prepared {len(self.all_categories)} categories for product generation")
+        return None
+    def store_products(self, products: List[Data]) -> List[Data]:
+        if self.hybrid_synthesis:
+            self.synthesize_product_fields(products)
+        self.all_products.extend(products)
+        self.product_index = self.build_index(self.all_products)
+        self.refresh_context_aliases()
+        self.llog.info(f"Successfully processed {len(self.all_products)} products")
+        self.status = self.stage_status()
+        return self.all_products
+    def merge_product_shards(self, shards: List[Dict], results: List[tuple[bool, Any]]) -> List[Data]:
+        """
+        Merges validated shard results in shard order, skipping failed shards and duplicate ids or names
+        """
+        seen_ids = set(self.build_index(self.all_products))
+        seen_names = {product_name_key(p.data) for p in self.all_products}
+        merged: List[Data] = []
+        failed_shards = []
+        for index, (success, result) in enumerate(results):
+            if not success:
+                failed_shards.append(index + 1)
+                continue
+            for product in result:
+                if product.data["id"] in seen_ids:
+                    self.llog.warning(f"Skipping duplicate product id {product.data['id']} from shard {index + 1}")
+                    continue
+                name = product_name_key(product.data)
+                if name and name in seen_names:
+                    self.llog.warning(f"Skipping duplicate product name {product.data.get('name')!r} from shard {index + 1}")
                     continue
-            self.llog.info(f"Successfully processed {len(self.all_products)} products")
+                seen_ids.add(product.data["id"])
+                seen_names.add(name)
+                merged.append(product)
+        if failed_shards:
+            self.llog.warning(f"{len(failed_shards)} of {len(shards)} product shards failed: {failed_shards}")
+        if len(failed_shards) == len(shards):
+            return [Data(data={
+                "text": "Error generating products",
+                "error": f"All {len(shards)} product shards failed"
+            })]
+        return self.store_products(merged)
+    def create_products(self) -> List[Data]:
+        return run_sync(self.acreate_products())
+    async def acreate_products(self) -> List[Data]:
+        """
+        Generates products, or waits for the generation the Products Stream output already started on this
+        component so the products are not requested and appended twice
+        """
+        with _PRODUCT_GENERATION_LOCK:
+            stream = self._product_stream
+            if stream is None:
+                self._products_created = created = threading.Event()
+        if stream is not None:
+            await asyncio.to_thread(stream.wait)
             return self.all_products
+        try:
+            return await self.agenerate_products()
+        finally:
+            created.set()
+    async def agenerate_products(self) -> List[Data]:
+        error = self.check_product_prerequisites()
+        if error:
+            return error
+        await asyncio.to_thread(self.begin_checkpointed_stage, "products")
+        try:
+            if not self.sharded_products:
+                try:
+                    products = await self.agenerate_product_chunk(self.num_products, self.all_categories, "product generation", len(self.all_products) + 1)
+                except ValueError as e:
+                    return [Data(data={
+                        "text": "Error generating products",
+                        "error": str(e)
+                    })]
+                return self.store_products(products)
+            shards = self.plan_product_shards()
+            self.llog.info(f"Generating {self.num_products} products in {len(shards)} shards with concurrency {self.max_concurrency}")
+            tasks = [
+                partial(self.agenerate_product_chunk, shard["count"], shard["categories"], f"product generation shard {index + 1}/{len(shards)}", shard["start"])
+                for index, shard in enumerate(shards)
+            ]
+            return self.merge_product_shards(shards, await self.arun_concurrently(tasks, "product generation"))
         except Exception as e:
-            self.llog.error(f"Error in create_products: {str(e)}")
+            self.llog.error(f"Error in agenerate_products: {str(e)}")
             return [Data(data={
                 "text": "Error generating products",
                 "error": f"Unexpected error: {str(e)}"
             })]
-    def create_users(self) -> List[Data]:
-        if not self.all_products or not self.all_categories:
-            self.llog.error("Attempting to create users without products or categories")
-            return [Data(data={
-                "text": "Error: Products and categories must be generated first",
-                "error": "Products and categories must be generated first"
-            })]
+    async def aiter_products(self) -> AsyncIterator[Data]:
+        """
+        Generates products chunk by chunk and yields each one as soon as it is validated.
+        With stream_output enabled records arrive while the LLM is still writing the chunk
+        """
+        error = self.check_product_prerequisites()
+        if error:
+            for record in error:
+                yield record
+            return
+        if self.sharded_products:
+            shards = self.plan_product_shards()
+        else:
+            shards = [{"count": self.num_products, "categories": self.all_categories, "start": len(self.all_products) + 1}]
+        self.product_index = self.build_index(self.all_products)
+        seen_names = {product_name_key(p.data) for p in self.all_products}
+        streamed = 0
         try:
-            # Prepare category and product information for prompt
-            category_info = []
-            product_info = []
-            # Process categories
-            for cat in self.all_categories:
+            for index, shard in enumerate(shards):
+                context = f"product stream chunk {index + 1}/{len(shards)}"
                 try:
-                    cat_data = cat.data
-                    if "parent_id" not in cat_data:
+                    async for record in self.astream_records(**self.product_chunk_request(shard["count"], shard["categories"], context, shard["start"])):
+                        for product in self.validate_products([record]):
+                            if product.data["id"] in self.product_index:
+                                self.llog.warning(f"Skipping duplicate product id {product.data['id']} from {context}")
+                                continue
+                            name = product_name_key(product.data)
+                            if name and name in seen_names:
+                                self.llog.warning(f"Skipping duplicate product name {product.data.get('name')!r} from {context}")
+                                continue
+                            seen_names.add(name)
+                            if self.hybrid_synthesis:
+                                self.synthesize_product_fields([product])
+                            self.all_products.append(product)
+                            self.product_index[product.data["id"]] = product
+                            streamed += 1
+                            yield product
+                except ValueError as e:
+                    self.llog.warning(f"Skipping failed {context}: {str(e)}")
+        finally:
+            self.refresh_context_aliases()
+            self.llog.info(f"Streamed {streamed} products")
+            self.status = self.stage_status()
+    async def areplay_products(self, created: threading.Event) -> AsyncIterator[Data]:
+        """
+        Yields the products of a Products output run once it finished, for the Products Stream
+        """
+        await asyncio.to_thread(created.wait)
+        for product in list(self.all_products):
+            yield product
+    def stream_products(self) -> Message:
+        """
+        Starts product generation right away on a background thread, or replays the products the Products
+        output generates on this component, so building both outputs only pays for one generation
+        Returns: Message whose text is an iterator of NDJSON lines, one per product as it is generated
+        """
+        with _PRODUCT_GENERATION_LOCK:
+            if self._product_stream is None:
+                created = self._products_created
+                products = self.areplay_products(created) if created is not None else self.aiter_products()
+                self._product_stream = ProductStream(products, self.ndjson_path)
+            stream = self._product_stream
+        return Message(text=stream.iter_lines())
+    def wait_for_products(self) -> None:
+        """
+        Blocks until a product generation started by the Products or Products Stream output of this component
+        finished, so later stages never read a partial product list
+        """
+        with _PRODUCT_GENERATION_LOCK:
+            stream, created = self._product_stream, self._products_created
+        if created is not None:
+            created.wait()
+        elif stream is not None:
+            stream.wait()
+    def validate_users(self, users: Iterable[Dict]) -> List[Data]:
+        validated: List[Data] = []
+        parsed = 0
+        rejected: Counter = Counter()
+        for user in users:
+            parsed += 1
+            try:
+                # Validate required fields
+                required_fields = ["id", "name", "email", "join_date"]
+                missing_fields = [field for field in required_fields if not user.get(field)]
+                if missing_fields:
+                    self.llog.warning(f"User missing required fields {missing_fields}: {user}")
+                    rejected["missing_field"] += 1
+                    continue
+                try:
+                    # Validate purchase history
+                    purchase_history = user.get("purchase_history", [])
+                    verified_purchases = []
+                    for purchase in purchase_history:
                         try:
-                            category_info.append({
-                                "id": cat_data["id"],
-                                "name": cat_data["name"]
-                            })
-                        except (KeyError, TypeError) as e:
-                            self.llog.warning(f"Missing or invalid fields in category: {str(e)}")
+                            product_id = self.resolve_reference(purchase.get("product_id"))
+                            if not product_id or product_id not in self.product_index:
+                                self.llog.warning(f"Invalid product_id in purchase history: {product_id}")
+                                rejected["bad_product_ref"] += 1
+                                continue
+                            verified_purchases.append({**purchase, "product_id": product_id})
+                        except Exception as e:
+                            self.llog.warning(f"Error processing purchase: {str(e)}")
                             continue
                 except Exception as e:
-                    self.llog.warning(f"Invalid category data structure: {str(e)}")
-                    continue
-            # Process products
-            for prod in self.all_products:
+                    self.llog.error(f"Error processing purchase history: {str(e)}")
+                    verified_purchases = []
                 try:
-                    prod_data = prod.data
+                    # Validate favorite categories
+                    favorite_cats = user.get("favorite_categories", [])
+                    verified_categories = []
+                    for cat in favorite_cats:
+                        try:
+                            category_id = self.resolve_reference(cat.get("category_id"))
+                            if not category_id or category_id not in self.category_index:
+                                self.llog.warning(f"Invalid category_id in favorites: {category_id}")
+                                rejected["bad_category_ref"] += 1
+                                continue
+                            verified_categories.append({**cat, "category_id": category_id})
+                        except Exception as e:
+                            self.llog.warning(f"Error processing favorite category: {str(e)}")
+                            continue
+                except Exception as e:
+                    self.llog.error(f"Error processing favorite categories: {str(e)}")
+                    verified_categories = []
+                # Validate date formats
+                for date_field in ["join_date", "last_login"]:
+                    date_value = user.get(date_field)
+                    if date_value and not re.match(r'^\d{4}-\d{2}-\d{2}', date_value):
+                        self.llog.warning(f"Invalid date format for {date_field}: {date_value}")
+                        rejected["bad_date"] += 1
+                        user[date_field] = None
+                # Add validated user
+                user_extra: Dict = {}
+                user_id = self.assign_record_id(user, user_extra)
+                validated.append(Data(
+                    data={
+                        "text": f"User Profile: {user['name']} ({user['email']})",
+                        "id": user_id,
+                        "name": user["name"],
+                        "email": user["email"],
+                        "join_date": user["join_date"],
+                        "purchase_history": verified_purchases,
+                        "favorite_categories": verified_categories,
+                        "total_spent": 0.0,
+                        "account_status": user.get("account_status", "active"),
+                        "last_login": user.get("last_login"),
+                        **user_extra
+                    }
+                ))
+            except Exception as e:
+                self.llog.error(f"Error processing user: {str(e)}")
+                rejected["error"] += 1
+                continue
+        self.record_validation("users", parsed, len(validated), rejected)
+        return validated
+    def check_user_prerequisites(self) -> Optional[List[Data]]:
+        if not self.all_products or not self.all_categories:
+            self.llog.error("Attempting to create users without products or categories")
+            return [Data(data={
+                "text": "Error: Products and categories must be generated first",
+                "error": "Products and categories must be generated first"
+            })]
+        if not self.category_index:
+            self.category_index = self.build_index(self.all_categories)
+        if not self.product_index:
+            self.product_index = self.build_index(self.all_products)
+        return None
+    def prepare_user_context(self) -> tuple[List[Dict], List[Dict]]:
+        """
+        Prepares category and product information for the users prompt
+        Returns: (category_info, product_info in stratified sampling order)
+        """
+        category_info = []
+        product_info = []
+        # Process categories
+        for cat in self.all_categories:
+            try:
+                cat_data = cat.data
+                if "parent_id" not in cat_data:
                     try:
-                        product_info.append({
-                            "id": prod_data["id"],
-                            "name": prod_data["name"],
-                            "price": prod_data["price"],
-                            "category_id": prod_data["category_id"]
+                        category_info.append({
+                            "id": self.display_id(cat_data["id"]),
+                            "name": cat_data["name"]
                         })
                     except (KeyError, TypeError) as e:
-                        self.llog.warning(f"Missing or invalid fields in product: {str(e)}")
+                        self.llog.warning(f"Missing or invalid fields in category: {str(e)}")
                         continue
-                except Exception as e:
-                    self.llog.warning(f"Invalid product data structure: {str(e)}")
+            except Exception as e:
+                self.llog.warning(f"Invalid category data structure: {str(e)}")
+                continue
+        # Process products
+        for prod in self.all_products:
+            try:
+                prod_data = prod.data
+                try:
+                    product_info.append({
+                        "id": self.display_id(prod_data["id"]),
+                        "name": prod_data["name"],
+                        "price": prod_data["price"],
+                        "category_id": self.display_id(prod_data["category_id"])
+                    })
+                except (KeyError, TypeError) as e:
+                    self.llog.warning(f"Missing or invalid fields in product: {str(e)}")
                     continue
-            self.llog.info(f"Prepared {len(category_info)} categories and {len(product_info)} products for user generation")
-            # Generate users using LLM
-            success, response_content = self.safe_llm_invoke(
-                prompt=self.generate_users_prompt(category_info, product_info),
-                context="user generation"
-            )
+            except Exception as e:
+                self.llog.warning(f"Invalid product data structure: {str(e)}")
+                continue
+        self.llog.info(f"Prepared {len(category_info)} categories and {len(product_info)} products for user generation")
+        return category_info, self.stratified_product_order(product_info)
+    def stratified_product_order(self, product_info: List[Dict]) -> List[Dict]:
+        """
+        Orders products so that windows of the list spread across categories and price bands: within each
+        category the products of the low, mid and high price band (deterministically shuffled) are taken in
+        turn, starting from a different band per category, and the categories are interleaved round-robin.
+        A window at least as long as the number of categories therefore covers every category that still has
+        products left at that depth, and successive picks of a category rotate through its price bands.
+        """
+        prices = sorted(float(p.get("price") or 0) for p in product_info)
+        bands = [prices[len(prices) // 3], prices[(2 * len(prices)) // 3]] if prices else [0.0, 0.0]
+        strata: Dict[str, List[List[Dict]]] = {}
+        for product in product_info:
+            price = float(product.get("price") or 0)
+            band = 0 if price < bands[0] else 1 if price < bands[1] else 2
+            strata.setdefault(str(product.get("category_id")), [[], [], []])[band].append(product)
+        sequences = []
+        for category_index, category in enumerate(sorted(strata)):
+            band_groups = [
+                sorted(group, key=lambda p: hashlib.sha1(str(p.get("id")).encode("utf-8")).hexdigest())
+                for group in strata[category]
+            ]
+            # Rotate the starting band so the first picks of neighbouring categories land in different bands
+            band_groups = band_groups[category_index % 3:] + band_groups[:category_index % 3]
+            sequence: List[Dict] = []
+            for position in range(max(len(group) for group in band_groups)):
+                sequence.extend(group[position] for group in band_groups if position < len(group))
+            sequences.append(sequence)
+        ordered: List[Dict] = []
+        for position in range(max((len(sequence) for sequence in sequences), default=0)):
+            ordered.extend(sequence[position] for sequence in sequences if position < len(sequence))
+        return ordered
+    def sample_user_products(self, product_info: List[Dict], batch_index: int = 0) -> List[Dict]:
+        """
+        Returns the fixed-size product window shown to users prompt number batch_index
+        product_info must already be in stratified_product_order
+        """
+        if not product_info:
+            return []
+        size = min(len(product_info), max(1, self.users_context_size or 1))
+        offset = (batch_index * size) % len(product_info)
+        sample = (product_info[offset:] + product_info[:offset])[:size]
+        self.sampled_product_ids = self.sampled_product_ids | {p.get("id") for p in sample}
+        return sample
+    def compute_coverage(self, users: List[Data], product_count: int) -> Dict[str, Any]:
+        purchased = {
+            purchase.get("product_id")
+            for user in users
+            for purchase in user.data.get("purchase_history", [])
+            if isinstance(purchase, dict)
+        }
+        shown = self.sampled_product_ids
+        return {
+            "users": len(users),
+            "products": product_count,
+            "products_in_prompts": len(shown),
+            "products_purchased": len(purchased),
+            "context_coverage": round(len(shown) / product_count, 4) if product_count else 0.0,
+            "purchase_coverage": round(len(purchased) / product_count, 4) if product_count else 0.0,
+        }
+    def users_request(self, category_info: List[Dict], product_info: List[Dict], batch_index: int = 0, count: Optional[int] = None, start: Optional[int] = None, context: str = "user generation") -> Dict:
+        if count is None:
+            count = self.num_users
+        if start is None:
+            start = len(self.all_users) + 1
+        product_info = self.sample_user_products(product_info, batch_index)
+        return {
+            "prompt": self.generate_users_prompt(category_info, product_info, count, start),
+            "context": context,
+            "expected_count": count,
+            "followup_prompt": lambda missing, existing: self.generate_followup_prompt(self.generate_users_prompt(category_info, product_info, missing, start + len(existing)), existing),
+            "table": "users",
+            "chunk": f"users-{start}-{count}",
+        }
+    def plan_user_batches(self) -> List[Dict]:
+        """
+        Splits num_users into batches of at most users_per_batch users
+        Returns: list of {"count": int, "start": int, "batch_index": int}
+        """
+        batch_size = max(1, self.users_per_batch or 1)
+        first = len(self.all_users) + 1
+        return [
+            {"count": min(batch_size, self.num_users - offset), "start": first + offset, "batch_index": index}
+            for index, offset in enumerate(range(0, self.num_users, batch_size))
+        ]
+    def store_user_batch(self, success: bool, users: Any, context: str) -> List[Data]:
+        if not success:
+            raise ValueError(f"Failed to get valid response: {users}")
+        validated = self.validate_users(users)
+        self.llog.info(f"Successfully validated {len(validated)} users for {context}")
+        return validated
+    async def agenerate_user_batch(self, request: Dict, checkpoint_key: Optional[str] = None) -> List[Data]:
+        """
+        Generates and validates one batch of users from a users_request
+        Raises ValueError when the LLM response is unusable so that a failed batch can be skipped
+        """
+        stored = await self.aload_checkpoint(checkpoint_key) if checkpoint_key else None
+        if stored is not None:
+            return stored
+        success, users = await self.agenerate_records(**request)
+        validated = self.store_user_batch(success, users, request["context"])
+        if checkpoint_key:
+            await self.asave_checkpoint(checkpoint_key, validated)
+        return validated
+    def user_batch_tasks(self, category_info: List[Dict], product_info: List[Dict], batches: List[Dict]) -> List[Callable[[], Awaitable[List[Data]]]]:
+        # Requests are built up front so product sampling happens in batch order
+        return [
+            partial(self.agenerate_user_batch, self.users_request(
+                category_info, product_info, batch["batch_index"], batch["count"], batch["start"],
+                f"user generation batch {index + 1}/{len(batches)}"
+            ), f"users-{batch['start']}-{batch['count']}")
+            for index, batch in enumerate(batches)
+        ]
+    def merge_user_batches(self, batches: List[Dict], results: List[tuple[bool, Any]]) -> List[Data]:
+        """
+        Merges validated batches in batch order, dropping users whose id or email was already taken
+        """
+        seen_ids = set(self.user_index) | {u.data.get("id") for u in self.all_users}
+        seen_emails = {str(u.data.get("email", "")).strip().lower() for u in self.all_users}
+        merged: List[Data] = []
+        failed_batches = []
+        for index, (success, result) in enumerate(results):
             if not success:
-                return [Data(data={
-                    "text": "Error generating users",
-                    "error": f"Failed to get valid response: {response_content}"
-                })]
-            # Process users
-            users = json.loads(response_content)
-            self.llog.info(f"Successfully generated {len(users)} users")
-            for user in users:
-                try:
-                    # Validate required fields
-                    required_fields = ["id", "name", "email", "join_date"]
-                    missing_fields = [field for field in required_fields if not user.get(field)]
-                    if missing_fields:
-                        self.llog.warning(f"User missing required fields {missing_fields}: {user}")
-                        continue
-                    try:
-                        # Validate purchase history
-                        purchase_history = user.get("purchase_history", [])
-                        verified_purchases = []
-                        for purchase in purchase_history:
-                            try:
-                                product_id = purchase.get("product_id")
-                                if not product_id or not any(p.data["id"] == product_id for p in self.all_products):
-                                    self.llog.warning(f"Invalid product_id in purchase history: {product_id}")
-                                    continue
-                                verified_purchases.append(purchase)
-                            except Exception as e:
-                                self.llog.warning(f"Error processing purchase: {str(e)}")
-                                continue
-                    except Exception as e:
-                        self.llog.error(f"Error processing purchase history: {str(e)}")
-                        verified_purchases = []
-                    try:
-                        # Validate favorite categories
-                        favorite_cats = user.get("favorite_categories", [])
-                        verified_categories = []
-                        for cat in favorite_cats:
-                            try:
-                                category_id = cat.get("category_id")
-                                if not category_id or not any(c.data["id"] == category_id for c in self.all_categories):
-                                    self.llog.warning(f"Invalid category_id in favorites: {category_id}")
-                                    continue
-                                verified_categories.append(cat)
-                            except Exception as e:
-                                self.llog.warning(f"Error processing favorite category: {str(e)}")
-                                continue
-                    except Exception as e:
-                        self.llog.error(f"Error processing favorite categories: {str(e)}")
-                        verified_categories = []
-                    # Validate date formats
-                    for date_field in ["join_date", "last_login"]:
-                        date_value = user.get(date_field)
-                        if date_value and not re.match(r'^\d{4}-\d{2}-\d{2}', date_value):
-                            self.llog.warning(f"Invalid date format for {date_field}: {date_value}")
-                            user[date_field] = None
-                    # Add validated user
-                    self.all_users.append(Data(
-                        data={
-                            "text": f"User Profile: {user['name']} ({user['email']})",
-                            "id": user["id"],
-                            "name": user["name"],
-                            "email": user["email"],
-                            "join_date": user["join_date"],
-                            "purchase_history": verified_purchases,
-                            "favorite_categories": verified_categories,
-                            "total_spent": user.get("total_spent", 0),
-                            "account_status": user.get("account_status", "active"),
-                            "last_login": user.get("last_login")
-                        }
-                    ))
-                except Exception as e:
-                    self.llog.error(f"Error processing user: {str(e)}")
+                failed_batches.append(index + 1)
+                continue
+            for user in result:
+                user_id = user.data.get("id")
+                email = str(user.data.get("email", "")).strip().lower()
+                if user_id in seen_ids or email in seen_emails:
+                    self.llog.warning(f"Skipping duplicate user {user_id} ({email}) from batch {index + 1}")
                     continue
-            self.llog.info(f"Successfully processed {len(self.all_users)} users")
-            return self.all_users
+                seen_ids.add(user_id)
+                seen_emails.add(email)
+                merged.append(user)
+        if failed_batches:
+            self.llog.warning(f"{len(failed_batches)} of {len(batches)} user batches failed: {failed_batches}")
+        if len(failed_batches) == len(batches):
+            return [Data(data={
+                "text": "Error generating users",
+                "error": f"All {len(batches)} user batches failed"
+            })]
+        return self.finish_users(merged)
+    def finish_users(self, users: List[Data]) -> List[Data]:
+        if self.hybrid_synthesis:
+            self.synthesize_user_fields(users)
+        self.price_user_purchases(users)
+        self.all_users.extend(users)
+        self.user_index = self.build_index(self.all_users)
+        self.coverage_report = self.compute_coverage(self.all_users, len(self.product_index))
+        self.status = {**self.coverage_report, **self.stage_status()}
+        self.llog.info(f"Successfully processed {len(self.all_users)} users, purchase coverage {self.coverage_report['purchase_coverage']:.1%} of {len(self.product_index)} products")
+        return self.all_users
+    def store_users(self, success: bool, users: Any, checkpoint_key: Optional[str] = None) -> List[Data]:
+        if not success:
+            return [Data(data={
+                "text": "Error generating users",
+                "error": f"Failed to get valid response: {users}"
+            })]
+        # Process users
+        validated = self.validate_users(users)
+        if checkpoint_key:
+            self.save_checkpoint(checkpoint_key, validated)
+        return self.finish_users(validated)
+    def create_users(self) -> List[Data]:
+        return run_sync(self.acreate_users())
+    async def acreate_users(self) -> List[Data]:
+        await asyncio.to_thread(self.wait_for_products)
+        error = self.check_user_prerequisites()
+        if error:
+            return error
+        await asyncio.to_thread(self.begin_checkpointed_stage, "users")
+        try:
+            category_info, product_info = self.prepare_user_context()
+            if self.batched_users:
+                batches = self.plan_user_batches()
+                self.llog.info(f"Generating {self.num_users} users in {len(batches)} batches with {self.user_workers} workers")
+                tasks = self.user_batch_tasks(category_info, product_info, batches)
+                return self.merge_user_batches(batches, await self.arun_concurrently(tasks, "user generation", self.user_workers))
+            key = f"users-1-{self.num_users}"
+            stored = await self.aload_checkpoint(key)
+            if stored is not None:
+                return self.finish_users(stored)
+            success, users = await self.agenerate_records(**self.users_request(category_info, product_info))
+            return await asyncio.to_thread(self.store_users, success, users, key)
         except Exception as e:
-            self.llog.error(f"Error in create_users: {str(e)}")
+            self.llog.error(f"Error in acreate_users: {str(e)}")
             return [Data(data={
                 "text": "Error generating users",
                 "error": f"Unexpected error: {str(e)}"
             })]
+    def export_dataset(self) -> List[Data]:
+        """
+        Writes the generated categories, products and users as typed Parquet or Arrow IPC tables
+        Returns: one Data per written table with its path, row count and size
+        """
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            return [Data(data={
+                "text": "Error exporting dataset",
+                "error": "pyarrow is required for columnar export"
+            })]
+        self.wait_for_products()
+        directory = os.path.expanduser(self.export_dir or ".")
+        extension = "parquet" if self.export_format == "parquet" else "arrow"
+        tables = (("categories", self.all_categories), ("products", self.all_products), ("users", self.all_users))
+        exported: List[Data] = []
+        try:
+            os.makedirs(directory, exist_ok=True)
+            for table, records in tables:
+                if not records:
+                    continue
+                path = os.path.join(directory, f"{table}.{extension}")
+                # Write next to the target and swap it in so a failed export never leaves a truncated table
+                partial_path = f"{path}.partial"
+                with ColumnarDatasetWriter(partial_path, table, self.export_format, self.export_row_group_size) as writer:
+                    writer.write_all(record.data for record in records)
+                os.replace(partial_path, path)
+                self.llog.info(f"Exported {writer.rows} {table} in {writer.row_groups} row groups to {path}")
+                exported.append(Data(data={
+                    "text": f"Exported {writer.rows} {table} to {path}",
+                    "table": table,
+                    "path": path,
+                    "format": self.export_format,
+                    "rows": writer.rows,
+                    "row_groups": writer.row_groups,
+                    "bytes": os.path.getsize(path),
+                }))
+        except Exception as e:
+            self.llog.error(f"Error in export_dataset: {str(e)}")
+            return [Data(data={
+                "text": "Error exporting dataset",
+                "error": f"Unexpected error: {str(e)}"
+            })]
+        if not exported:
+            return [Data(data={
+                "text": "Error exporting dataset",
+                "error": "No generated records to export"
+            })]
+        return exported